@@ -3,32 +3,100 @@ OncoSeg API - 3D Tumor Segmentation for Medical Imaging
 HuggingFace Space: tp53/oncoseg-api
 
 This provides a Gradio API for 3D tumor segmentation using the OncoSeg model.
-Accepts NIfTI files and returns segmentation masks.
+Accepts NIfTI files and returns bit-packed, gzipped segmentation masks.
 
 FIX: Returns JSON as string to avoid Gradio schema issues with nested dicts.
 """
 
-import gradio as gr
-import numpy as np
-import json
 import base64
-import gzip
+import json
+import math
+import struct
+import threading
+import zlib
+from functools import lru_cache
 from typing import Optional
-import os
 
-# Model loading (lazy)
+import gradio as gr
+import numpy as np
+
+# pybase64 is a SIMD-accelerated drop-in for the stdlib codec
+try:
+    import pybase64
+
+    HAS_PYBASE64 = True
+except ImportError:
+    HAS_PYBASE64 = False
+
+# Numba is optional - fall back to plain NumPy for the demo mask if missing
+try:
+    from numba import njit, prange
+
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    print("Numba not available - demo masks will use the NumPy path")
+
+# NIfTI-1 header: dims at offset 40, 8 int16 values
+# dim[0] = number of dimensions, dim[1-7] = sizes
+_NIFTI_DIMS = struct.Struct("<8h")
+_NIFTI_MAGICS = frozenset((b"n+1\x00", b"ni1\x00"))
+
+# Masks are sent bit-packed (see encode_mask)
+MASK_DTYPE = "bitpacked_uint8"
+
+# Model loading (cached per checkpoint, default warmed at import)
 model = None
 model_name = "default"
+_model_lock = threading.Lock()
+
+# Per-thread mask buffers reused across requests (see _get_scratch)
+_scratch = threading.local()
+
+
+def b64decode(data: str) -> bytes:
+    """Decode a base64 payload, using pybase64 when available."""
+    if HAS_PYBASE64:
+        return pybase64.b64decode(data, validate=False)
+    return base64.b64decode(data)
+
+
+def b64encode(data: bytes) -> str:
+    """Encode bytes as a base64 string, using pybase64 when available."""
+    if HAS_PYBASE64:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode("ascii")
+
+
+def gzip_compress(data, level: int = 1) -> bytes:
+    """
+    Gzip-compress data with zlib directly.
+    Binary masks are long runs of 0/1, so level 1 with the Z_RLE strategy
+    beats the gzip module's default level 9 on size at a fraction of the CPU.
+    The output is still standard gzip framing that any client can inflate.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31, 9, zlib.Z_RLE)
+    return compressor.compress(data) + compressor.flush()
+
+
+@lru_cache(maxsize=4)
+def _get_model(checkpoint: str):
+    """
+    Load a checkpoint once and keep it for reuse across requests.
+    The lock serializes loads in case the real loader is not reentrant.
+    """
+    with _model_lock:
+        # In production, load actual OncoSeg model here
+        # For now, return a stub that generates demo segmentation
+        return "loaded"
 
 
 def load_model(checkpoint: str = "default"):
     """Load the segmentation model (stub - replace with actual model loading)"""
     global model, model_name
 
-    # In production, load actual OncoSeg model here
-    # For now, return a stub that generates demo segmentation
+    model = _get_model(checkpoint)
     model_name = checkpoint
-    model = "loaded"
 
     return f"Model '{checkpoint}' loaded"
 
@@ -47,66 +115,43 @@ def segment_nifti(
     Returns:
         JSON string with segmentation results (NOT dict - Gradio compatibility)
     """
-    global model, model_name
-
     try:
-        # Load model if needed
-        if model is None or model_name != checkpoint:
-            load_model(checkpoint)
+        # Cached per checkpoint - only the first request for each one loads
+        load_model(checkpoint)
 
         # Decode the NIfTI file
-        nifti_bytes = base64.b64decode(nifti_base64)
+        nifti_bytes = b64decode(nifti_base64)
 
-        # Check if gzipped
+        # Check if gzipped (wbits=31 expects gzip framing)
         if nifti_bytes[:2] == b"\x1f\x8b":
-            nifti_bytes = gzip.decompress(nifti_bytes)
-
-        # Parse NIfTI header to get dimensions
-        # NIfTI-1 header: dims at offset 40, 8 int16 values
-        # dim[0] = number of dimensions, dim[1-7] = sizes
-        import struct
+            nifti_bytes = zlib.decompress(nifti_bytes, 31)
 
         # Check for NIfTI magic number
         magic = nifti_bytes[344:348]
-        if magic not in [b"n+1\x00", b"ni1\x00"]:
+        if magic not in _NIFTI_MAGICS:
             # Try as raw volume (assume 64x64x64 for demo)
             shape = (64, 64, 64)
         else:
-            dims = struct.unpack("<8h", nifti_bytes[40:56])
+            dims = _NIFTI_DIMS.unpack_from(nifti_bytes, 40)
             ndim = dims[0]
             shape = tuple(dims[1 : ndim + 1])
 
-        # Generate segmentation mask
+        # Generate, encode and measure the segmentation mask
         # In production, run actual model inference here
-        mask = generate_demo_mask(shape, threshold)
-
-        # Encode mask as base64 for transmission
-        mask_bytes = mask.astype(np.uint8).tobytes()
-        mask_compressed = gzip.compress(mask_bytes)
-        mask_base64 = base64.b64encode(mask_compressed).decode("utf-8")
+        mask_base64, tumor_voxels, bbox = _demo_response(shape, threshold, checkpoint)
 
         # Calculate tumor statistics
-        tumor_voxels = int(np.sum(mask > 0))
-        total_voxels = int(np.prod(shape))
+        total_voxels = math.prod(shape)
         tumor_percentage = (
             (tumor_voxels / total_voxels) * 100 if total_voxels > 0 else 0
         )
 
-        # Find bounding box of tumor
-        if tumor_voxels > 0:
-            coords = np.where(mask > 0)
-            bbox = {
-                "min": [int(c.min()) for c in coords],
-                "max": [int(c.max()) for c in coords],
-            }
-        else:
-            bbox = None
-
         result = {
             "success": True,
             "shape": list(shape),
-            "mask_base64": mask_base64,
-            "mask_dtype": "uint8",
+            "mask_dtype": MASK_DTYPE,
+            "mask_bit_order": "little",
+            "mask_bits": total_voxels,
             "statistics": {
                 "tumor_voxels": tumor_voxels,
                 "total_voxels": total_voxels,
@@ -119,7 +164,9 @@ def segment_nifti(
 
         # IMPORTANT: Return as JSON string, not dict
         # This fixes Gradio's JSON schema validation issues
-        return json.dumps(result)
+        # Base64 never needs JSON escaping, so splice it in after serializing
+        # the small metadata dict rather than having json.dumps scan it
+        return f'{json.dumps(result)[:-1]}, "mask_base64": "{mask_base64}"}}'
 
     except Exception as e:
         error_result = {
@@ -130,13 +177,73 @@ def segment_nifti(
         return json.dumps(error_result)
 
 
-def generate_demo_mask(shape: tuple, threshold: float = 0.5) -> np.ndarray:
+# Cosmetic boundary noise for the demo mask, tiled across the volume.
+# Generated once so requests never allocate or fill a full-volume RNG buffer.
+_NOISE_TILE_SIZE = 32
+_NOISE_TILE = np.random.default_rng(42).random(
+    (_NOISE_TILE_SIZE,) * 3, dtype=np.float32
+) * np.float32(0.3)
+
+if HAS_NUMBA:
+
+    @njit(
+        "void(uint8[:, :, ::1], f8, f8, f8, f8, f8, f8, f4[:, :, ::1])",
+        parallel=True,
+        fastmath=True,
+        cache=True,
+    )
+    def _ellipsoid_mask_numba(out, cz, cy, cx, rz, ry, rx, noise_tile):
+        """
+        Fill `out` with the irregular ellipsoid in a single pass.
+        Distance, noise and threshold are computed per voxel, so no
+        volume-sized temporaries are allocated.
+        """
+        nz, ny, nx = out.shape
+        tile = noise_tile.shape[0]
+        for z in prange(nz):
+            dz = (z - cz) / rz
+            dz2 = dz * dz
+            tz = z % tile
+            for y in range(ny):
+                dy = (y - cy) / ry
+                dzy = dz2 + dy * dy
+                ty = y % tile
+                for x in range(nx):
+                    dx = (x - cx) / rx
+                    d = dzy + dx * dx
+                    if d <= 1.0:
+                        out[z, y, x] = 1
+                    elif d > 1.3:
+                        out[z, y, x] = 0
+                    else:
+                        noise = noise_tile[tz, ty, x % tile]
+                        out[z, y, x] = 1 if d <= 1.0 + noise * 0.5 else 0
+
+
+def _get_scratch(shape: tuple) -> np.ndarray:
+    """
+    Return this thread's reusable uint8 mask buffer for `shape`.
+    Same-shape requests (the common case) reuse one allocation.
+    """
+    buf = getattr(_scratch, "mask", None)
+    if buf is None or buf.shape != shape:
+        buf = np.empty(shape, dtype=np.uint8)
+        _scratch.mask = buf
+    return buf
+
+
+def generate_demo_mask(
+    shape: tuple, threshold: float = 0.5, out: Optional[np.ndarray] = None
+) -> np.ndarray:
     """
     Generate a demo segmentation mask (ellipsoid tumor).
     Replace this with actual model inference in production.
+
+    If `out` is given (C-contiguous uint8 of `shape`) the mask is written
+    into it and returned; otherwise a new array is allocated.
     """
-    # Create coordinate grids
-    z, y, x = np.ogrid[: shape[0], : shape[1], : shape[2]]
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
 
     # Center of the volume
     cz, cy, cx = shape[0] // 2, shape[1] // 2, shape[2] // 2
@@ -146,26 +253,99 @@ def generate_demo_mask(shape: tuple, threshold: float = 0.5) -> np.ndarray:
     ry = shape[1] * 0.18
     rx = shape[2] * 0.20
 
-    # Create ellipsoid mask
-    distance = ((z - cz) / rz) ** 2 + ((y - cy) / ry) ** 2 + ((x - cx) / rx) ** 2
-    mask = (distance <= 1.0).astype(np.uint8)
+    if HAS_NUMBA and len(shape) == 3:
+        _ellipsoid_mask_numba(out, cz, cy, cx, rz, ry, rx, _NOISE_TILE)
+        return out
+
+    # Per-axis squared distances, broadcast-summed into one float32 volume
+    dz2 = (((np.arange(shape[0]) - cz) / rz) ** 2).astype(np.float32)
+    dy2 = (((np.arange(shape[1]) - cy) / ry) ** 2).astype(np.float32)
+    dx2 = (((np.arange(shape[2]) - cx) / rx) ** 2).astype(np.float32)
+    distance = np.empty((shape[0], shape[1], shape[2]), dtype=np.float32)
+    distance[:] = dz2[:, None, None]
+    distance += dy2[None, :, None]
+    distance += dx2[None, None, :]
+
+    # Add some irregularity: threshold is 1.0 + noise * 0.5, noise in [0, 0.3)
+    tile = _NOISE_TILE_SIZE
+    limit = _NOISE_TILE[
+        (np.arange(shape[0]) % tile)[:, None, None],
+        (np.arange(shape[1]) % tile)[None, :, None],
+        (np.arange(shape[2]) % tile)[None, None, :],
+    ]
+    limit *= 0.5
+    limit += 1.0
+    # bool and uint8 share a layout, so write the comparison straight into out
+    mask = out.view(np.bool_)
+    np.less_equal(distance, limit, out=mask)
+    mask &= distance <= 1.3
+
+    return out
+
+
+if HAS_NUMBA:
+
+    @njit(cache=True)
+    def _stats_and_bbox_numba(mask):
+        """Count foreground voxels and find their bounds in one traversal."""
+        nz, ny, nx = mask.shape
+        count = 0
+        zmin, ymin, xmin = nz, ny, nx
+        zmax, ymax, xmax = -1, -1, -1
+        for z in range(nz):
+            for y in range(ny):
+                for x in range(nx):
+                    if mask[z, y, x]:
+                        count += 1
+                        if z < zmin:
+                            zmin = z
+                        if z > zmax:
+                            zmax = z
+                        if y < ymin:
+                            ymin = y
+                        if y > ymax:
+                            ymax = y
+                        if x < xmin:
+                            xmin = x
+                        if x > xmax:
+                            xmax = x
+        return count, zmin, zmax, ymin, ymax, xmin, xmax
+
+
+def mask_statistics(mask: np.ndarray) -> tuple:
+    """
+    Count tumor voxels and compute the bounding box of a mask.
 
-    # Add some irregularity
-    np.random.seed(42)  # Reproducible
-    noise = np.random.rand(*shape) * 0.3
-    mask = ((distance <= 1.0 + noise * 0.5) & (distance <= 1.3)).astype(np.uint8)
+    Returns:
+        (tumor_voxels, bbox) where bbox is {"min": [...], "max": [...]}
+        or None for an empty mask
+    """
+    if HAS_NUMBA and mask.ndim == 3:
+        count, zmin, zmax, ymin, ymax, xmin, xmax = _stats_and_bbox_numba(mask)
+        if count == 0:
+            return 0, None
+        return int(count), {
+            "min": [int(zmin), int(ymin), int(xmin)],
+            "max": [int(zmax), int(ymax), int(xmax)],
+        }
 
-    return mask
+    tumor_voxels = int(np.count_nonzero(mask))
+    if tumor_voxels == 0:
+        return 0, None
 
+    # Project onto each axis instead of materializing np.where index arrays
+    mins, maxs = [], []
+    for axis in range(mask.ndim):
+        other_axes = tuple(a for a in range(mask.ndim) if a != axis)
+        nonzero = np.flatnonzero(np.any(mask, axis=other_axes))
+        mins.append(int(nonzero[0]))
+        maxs.append(int(nonzero[-1]))
+    return tumor_voxels, {"min": mins, "max": maxs}
 
-def get_available_checkpoints() -> str:
-    """
-    Get list of available model checkpoints.
 
-    Returns:
-        JSON string with checkpoint list
-    """
-    checkpoints = {
+# Checkpoint list is static, so serialize it once at import
+_CHECKPOINTS_JSON = json.dumps(
+    {
         "checkpoints": [
             {
                 "id": "default",
@@ -193,100 +373,153 @@ def get_available_checkpoints() -> str:
             },
         ]
     }
-    return json.dumps(checkpoints)
+)
+
+# Same output as json.dumps on the health dict, minus the per-call dict build
+_HEALTH_TEMPLATE = '{{"status": "healthy", "model_loaded": {}, "model_name": {}}}'
+
+
+def encode_mask(mask: np.ndarray) -> str:
+    """
+    Bit-pack, gzip and base64-encode a binary mask for transmission.
+    Eight voxels per byte, little bit order; clients unpack with
+    np.unpackbits(..., count=mask_bits, bitorder="little").reshape(shape).
+    """
+    packed = np.packbits(mask, axis=None, bitorder="little")
+    # packbits output is contiguous uint8, so zlib reads its buffer directly
+    return b64encode(gzip_compress(memoryview(packed).cast("B")))
+
+
+@lru_cache(maxsize=64)
+def _demo_response(shape: tuple, threshold: float, checkpoint: str) -> tuple:
+    """
+    Build the (mask_base64, tumor_voxels, bbox) triple for a demo request.
+    The demo mask is deterministic, so repeat requests are a cache lookup.
+    Callers must not mutate the returned bbox.
+    """
+    # The mask is only needed until it is encoded, so use the scratch buffer
+    mask = generate_demo_mask(shape, threshold, out=_get_scratch(shape))
+    tumor_voxels, bbox = mask_statistics(mask)
+    return encode_mask(mask), tumor_voxels, bbox
+
+
+def get_available_checkpoints() -> str:
+    """
+    Get list of available model checkpoints.
+
+    Returns:
+        JSON string with checkpoint list
+    """
+    return _CHECKPOINTS_JSON
 
 
 def health_check() -> str:
     """Health check endpoint"""
-    return json.dumps(
-        {
-            "status": "healthy",
-            "model_loaded": model is not None,
-            "model_name": model_name,
-        }
+    return _HEALTH_TEMPLATE.format(
+        "true" if model is not None else "false", json.dumps(model_name)
     )
 
 
-# Create Gradio interface
-with gr.Blocks(title="OncoSeg API") as demo:
-    gr.Markdown("""
-    # OncoSeg API - 3D Tumor Segmentation
-    
-    This API provides 3D tumor segmentation for medical imaging (NIfTI format).
-    
-    ## API Endpoints
-    
-    Use the Gradio API client to call these functions:
-    
-    - `segment_nifti(nifti_base64, checkpoint, threshold)` - Segment a NIfTI volume
-    - `get_available_checkpoints()` - List available model checkpoints
-    - `health_check()` - Check API health
-    
-    ## Usage Example (Python)
-    
-    ```python
-    from gradio_client import Client
-    import base64
-    import json
-    
-    client = Client("tp53/oncoseg-api")
-    
-    # Load and encode NIfTI file
-    with open("scan.nii.gz", "rb") as f:
-        nifti_b64 = base64.b64encode(f.read()).decode()
-    
-    # Call segmentation
-    result_str = client.predict(
-        nifti_base64=nifti_b64,
-        checkpoint="default",
-        threshold=0.5,
-        api_name="/segment_nifti"
-    )
-    
-    # Parse result (returns JSON string)
-    result = json.loads(result_str)
-    print(f"Tumor: {result['statistics']['tumor_percentage']:.1f}%")
-    ```
-    """)
-
-    with gr.Tab("Segment"):
-        with gr.Row():
-            with gr.Column():
-                nifti_input = gr.Textbox(
-                    label="NIfTI Base64",
-                    placeholder="Base64-encoded NIfTI file",
-                    lines=3,
-                )
-                checkpoint_input = gr.Dropdown(
-                    choices=["default", "liver", "brain", "lung"],
-                    value="default",
-                    label="Model Checkpoint",
-                )
-                threshold_input = gr.Slider(
-                    minimum=0.1, maximum=0.9, value=0.5, step=0.1, label="Threshold"
-                )
-                segment_btn = gr.Button("Segment", variant="primary")
-
-            with gr.Column():
-                output = gr.Textbox(label="Result (JSON)", lines=10)
-
-        segment_btn.click(
-            fn=segment_nifti,
-            inputs=[nifti_input, checkpoint_input, threshold_input],
-            outputs=output,
+# Warm the default checkpoint so the first request pays no load cost
+load_model("default")
+
+
+def build_demo() -> gr.Blocks:
+    """Create the Gradio interface (only when launching, not on import)"""
+    with gr.Blocks(title="OncoSeg API") as demo:
+        gr.Markdown("""
+        # OncoSeg API - 3D Tumor Segmentation
+        
+        This API provides 3D tumor segmentation for medical imaging (NIfTI format).
+        
+        ## API Endpoints
+        
+        Use the Gradio API client to call these functions:
+        
+        - `segment_nifti(nifti_base64, checkpoint, threshold)` - Segment a NIfTI volume
+        - `get_available_checkpoints()` - List available model checkpoints
+        - `health_check()` - Check API health
+        
+        ## Usage Example (Python)
+        
+        ```python
+        from gradio_client import Client
+        import base64
+        import json
+        
+        client = Client("tp53/oncoseg-api")
+        
+        # Load and encode NIfTI file
+        with open("scan.nii.gz", "rb") as f:
+            nifti_b64 = base64.b64encode(f.read()).decode()
+        
+        # Call segmentation
+        result_str = client.predict(
+            nifti_base64=nifti_b64,
+            checkpoint="default",
+            threshold=0.5,
+            api_name="/segment_nifti"
         )
+        
+        # Parse result (returns JSON string)
+        result = json.loads(result_str)
+        print(f"Tumor: {result['statistics']['tumor_percentage']:.1f}%")
 
-    with gr.Tab("Checkpoints"):
-        checkpoints_btn = gr.Button("Get Checkpoints")
-        checkpoints_output = gr.Textbox(label="Available Checkpoints", lines=10)
-        checkpoints_btn.click(fn=get_available_checkpoints, outputs=checkpoints_output)
+        # Decode the bit-packed mask
+        import gzip
+        import numpy as np
 
-    with gr.Tab("Health"):
-        health_btn = gr.Button("Health Check")
-        health_output = gr.Textbox(label="Status", lines=3)
-        health_btn.click(fn=health_check, outputs=health_output)
+        packed = np.frombuffer(
+            gzip.decompress(base64.b64decode(result["mask_base64"])), np.uint8
+        )
+        mask = np.unpackbits(
+            packed, count=result["mask_bits"], bitorder="little"
+        ).reshape(result["shape"])
+        ```
+        """)
+
+        with gr.Tab("Segment"):
+            with gr.Row():
+                with gr.Column():
+                    nifti_input = gr.Textbox(
+                        label="NIfTI Base64",
+                        placeholder="Base64-encoded NIfTI file",
+                        lines=3,
+                    )
+                    checkpoint_input = gr.Dropdown(
+                        choices=["default", "liver", "brain", "lung"],
+                        value="default",
+                        label="Model Checkpoint",
+                    )
+                    threshold_input = gr.Slider(
+                        minimum=0.1, maximum=0.9, value=0.5, step=0.1, label="Threshold"
+                    )
+                    segment_btn = gr.Button("Segment", variant="primary")
+
+                with gr.Column():
+                    output = gr.Textbox(label="Result (JSON)", lines=10)
+
+            segment_btn.click(
+                fn=segment_nifti,
+                inputs=[nifti_input, checkpoint_input, threshold_input],
+                outputs=output,
+            )
+
+        with gr.Tab("Checkpoints"):
+            checkpoints_btn = gr.Button("Get Checkpoints")
+            checkpoints_output = gr.Textbox(label="Available Checkpoints", lines=10)
+            checkpoints_btn.click(
+                fn=get_available_checkpoints, outputs=checkpoints_output
+            )
+
+        with gr.Tab("Health"):
+            health_btn = gr.Button("Health Check")
+            health_output = gr.Textbox(label="Status", lines=3)
+            health_btn.click(fn=health_check, outputs=health_output)
+
+    return demo
 
 
 # Launch
 if __name__ == "__main__":
-    demo.launch()
+    build_demo().launch()
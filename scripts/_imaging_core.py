@@ -0,0 +1,219 @@
+"""
+Shared volume -> PNG slice pipeline for the real-imaging scripts.
+
+process_real_brats.py, fetch_real_medical_images.py and
+process_all_tcia_scans.py all normalize a 3-D volume to 8 bits, pick a set
+of slices and write them as 512x512 PNGs; this module does that once.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Optional: OpenCV resizes (and encodes PNG) much faster than Pillow
+try:
+    import cv2
+
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+# Optional: Numba fuses windowing into one parallel pass over the volume
+try:
+    from numba import njit, prange
+
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+TARGET_SIZE = (512, 512)
+# Voxels sampled when estimating normalization percentiles
+PERCENTILE_SAMPLES = 1_000_000
+
+
+def foreground_percentiles(volume: np.ndarray) -> Tuple[float, float]:
+    """
+    1st/99th percentiles of the nonzero voxels, or (0, 1) if there are none.
+    Large volumes are estimated from a fixed-seed uniform voxel sample.
+    """
+    # order="A" flattens NIfTI's Fortran-ordered (or memory-mapped) volumes
+    # as a view; a C-order reshape would copy the whole volume first
+    flat = volume.reshape(-1, order="A")
+    if flat.size > PERCENTILE_SAMPLES:
+        rng = np.random.default_rng(0)
+        sample = flat[rng.integers(0, flat.size, PERCENTILE_SAMPLES)]
+        nonzero = sample[sample > 0]
+        # Too little foreground in the sample for a stable estimate
+        if nonzero.size < PERCENTILE_SAMPLES // 100:
+            nonzero = flat[flat > 0]
+    else:
+        nonzero = flat[flat > 0]
+    if nonzero.size == 0:
+        return 0, 1
+    p1, p99 = np.percentile(nonzero, [1, 99])
+    return p1, p99
+
+
+def compute_norm(
+    volume: np.ndarray, window: Optional[Dict] = None
+) -> Tuple[float, float]:
+    """
+    Intensity range mapped onto 0-255: the window's [center -/+ width/2]
+    if one is given (CT), else the foreground percentiles (MRI).
+    """
+    if window is not None:
+        return (
+            window["center"] - window["width"] / 2,
+            window["center"] + window["width"] / 2,
+        )
+    return foreground_percentiles(volume)
+
+
+if HAS_NUMBA:
+
+    @njit(parallel=True, cache=True, error_model="numpy")
+    def _window_u8_numba(volume, lo, hi, out):
+        """Clip, rescale and quantize to uint8 in one pass over the volume."""
+        width = hi - lo
+        for k in prange(volume.shape[0]):
+            for i in range(volume.shape[1]):
+                for j in range(volume.shape[2]):
+                    v = np.float32(volume[k, i, j])
+                    if v < lo:
+                        v = lo
+                    elif v > hi:
+                        v = hi
+                    out[k, i, j] = np.uint8((v - lo) / width * np.float32(255.0))
+
+
+def window_u8(volume: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    """
+    Map [lo, hi] linearly onto 0-255 (float32 math, values clipped) into a
+    new C-contiguous uint8 array; an empty range maps to all zeros.
+    """
+    out = np.empty(volume.shape, dtype=np.uint8)
+    if not hi > lo:
+        out[...] = 0
+        return out
+
+    lo, hi = np.float32(lo), np.float32(hi)
+    if HAS_NUMBA and volume.ndim == 3:
+        _window_u8_numba(volume, lo, hi, out)
+    else:
+        windowed = np.clip(volume, lo, hi, dtype=np.float32)
+        windowed -= lo
+        windowed /= hi - lo
+        windowed *= 255
+        np.copyto(out, windowed, casting="unsafe")
+    return out
+
+
+def axial_slices(data: np.ndarray, indices: np.ndarray, axis: int = 2) -> np.ndarray:
+    """
+    Gather slices along a NIfTI volume's axis as an (N, H, W) stack, rotated
+    and flipped for proper (radiological) orientation. Only the gather
+    copies; the reorientation is a view.
+    """
+    stack = np.moveaxis(np.take(data, indices, axis=axis), axis, 0)
+    return np.rot90(stack, k=1, axes=(1, 2))[:, ::-1]
+
+
+def encode_slice(task: Tuple[np.ndarray, Path]) -> None:
+    """Resize one uint8 slice to TARGET_SIZE and save it as PNG (pool worker)."""
+    img_array, output_path = task
+
+    img_array = np.ascontiguousarray(img_array, dtype=np.uint8)
+    h, w = img_array.shape
+    needs_resize = (w, h) != TARGET_SIZE
+
+    if HAS_CV2:
+        if needs_resize:
+            # Area averaging when shrinking, Lanczos when enlarging
+            shrinking = w >= TARGET_SIZE[0] and h >= TARGET_SIZE[1]
+            interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4
+            img_array = cv2.resize(img_array, TARGET_SIZE, interpolation=interpolation)
+        cv2.imwrite(str(output_path), img_array, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        return
+
+    # Wrap the buffer without copying; native-resolution slices skip resize
+    img = Image.frombuffer("L", (w, h), img_array, "raw", "L", 0, 1)
+    if needs_resize:
+        img = img.resize(TARGET_SIZE, Image.Resampling.LANCZOS)
+
+    # Save with the fastest zlib setting
+    img.save(output_path, optimize=False, compress_level=1)
+
+
+def write_pngs(
+    slices: np.ndarray,
+    output_dir: Path,
+    workers: Optional[int] = None,
+    progress_every: int = 0,
+) -> List[str]:
+    """
+    Encode uint8 slices as output_dir/slice_NNN.png and return the file names.
+    workers=1 encodes inline (for callers already running in a pool).
+    """
+    files = [f"slice_{i:03d}.png" for i in range(len(slices))]
+    tasks = [(img, output_dir / name) for img, name in zip(slices, files)]
+
+    def run(mapper):
+        for i, _ in enumerate(mapper(encode_slice, tasks)):
+            if progress_every and i % progress_every == 0:
+                print(f"  Processed slice {i + 1}/{len(tasks)}")
+
+    if workers == 1:
+        run(map)
+    else:
+        # spawn: a forked child of a process whose Numba thread pool has
+        # started can hang on exit
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            # map() yields in slice order
+            run(lambda fn, it: executor.map(fn, it, chunksize=4))
+    return files
+
+
+def slice_cache_key(input_path: Path, window: Optional[Dict], num_slices: int) -> str:
+    """
+    Hash of everything that determines the output pixels: the input file's
+    mtime and size, the window, the slice count and TARGET_SIZE.
+    """
+    st = input_path.stat()
+    key = "|".join(
+        [
+            str(st.st_mtime_ns),
+            str(st.st_size),
+            json.dumps(window, sort_keys=True),
+            str(num_slices),
+            str(TARGET_SIZE),
+        ]
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def cached_slices(output_dir: Path, key: str) -> Optional[List[str]]:
+    """
+    Slice file names from output_dir/manifest.json if it was written with
+    this cacheKey and every slice is still on disk, else None.
+    """
+    try:
+        with open(output_dir / "manifest.json") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    files = manifest.get("sliceFiles")
+    if manifest.get("cacheKey") != key or not files:
+        return None
+    if not all((output_dir / name).exists() for name in files):
+        return None
+    return files
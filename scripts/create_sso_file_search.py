@@ -4,24 +4,39 @@ Create Gemini File Search store for SSO Guidelines
 
 Usage:
     source .venv/bin/activate
-    python scripts/create_sso_file_search.py
+    python scripts/create_sso_file_search.py [--overwrite]
 """
 
+import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from threading import Lock
 from google import genai
 from google.genai import types
 
+try:
+    from dotenv import load_dotenv
+
+    HAS_DOTENV = True
+except ImportError:
+    HAS_DOTENV = False
+
 # Load API key from environment or .env file
 API_KEY = os.getenv("GOOGLE_AI_API_KEY")
 if not API_KEY:
     # Try loading from .env
     env_path = Path(__file__).parent.parent / ".env"
-    if env_path.exists():
+    if env_path.exists() and HAS_DOTENV:
+        # python-dotenv handles quoting, comments and `export` prefixes
+        load_dotenv(env_path)
+        API_KEY = os.getenv("GOOGLE_AI_API_KEY")
+    elif env_path.exists():
         with open(env_path) as f:
             for line in f:
-                if line.startswith("GOOGLE_AI_API_KEY="):
-                    API_KEY = line.strip().split("=", 1)[1]
+                key, _, value = line.partition("=")
+                if key == "GOOGLE_AI_API_KEY":
+                    API_KEY = value.strip()
                     break
 
 if not API_KEY:
@@ -35,6 +50,11 @@ client = genai.Client(api_key=API_KEY)
 # SSO Guidelines directory
 SSO_DIR = Path(__file__).parent.parent / "guidelines" / "sso"
 
+STORE_DISPLAY_NAME = "SSO Surgical Oncology Guidelines"
+
+# Concurrent uploads (bounded to stay well under API rate limits)
+UPLOAD_WORKERS = 8
+
 
 def list_existing_stores():
     """List all existing file search stores"""
@@ -43,8 +63,8 @@ def list_existing_stores():
         stores = list(client.file_search_stores.list())
         if not stores:
             print("  No existing stores found")
-        for store in stores:
-            print(f"  - {store.display_name}: {store.name}")
+        else:
+            print("\n".join(f"  - {s.display_name}: {s.name}" for s in stores))
         return stores
     except Exception as e:
         print(f"  Error listing stores: {e}")
@@ -57,7 +77,7 @@ def create_store():
 
     store = client.file_search_stores.create(
         config=types.CreateFileSearchStoreConfig(
-            display_name="SSO Surgical Oncology Guidelines",
+            display_name=STORE_DISPLAY_NAME,
         )
     )
 
@@ -71,7 +91,33 @@ def create_store():
     return store
 
 
-def upload_documents(store):
+def _upload_one(pdf_path, store_name):
+    """Upload a single PDF and wait for indexing; returns the log lines"""
+    size_kb = pdf_path.stat().st_size // 1024
+    lines = [f"\n  {pdf_path.name} ({size_kb}KB)"]
+
+    # Use the upload_to_file_search_store method
+    # file parameter accepts path string directly
+    operation = client.file_search_stores.upload_to_file_search_store(
+        file_search_store_name=store_name,
+        file=str(pdf_path),
+        config=types.UploadToFileSearchStoreConfig(
+            display_name=pdf_path.stem,
+        ),
+    )
+    lines.append(
+        f"    -> Upload started: {operation.name if hasattr(operation, 'name') else 'OK'}"
+    )
+
+    # Wait for operation to complete if it's async
+    if hasattr(operation, "result"):
+        result = operation.result()
+        lines.append(f"    -> Completed: {result}")
+
+    return lines
+
+
+def upload_documents(store, max_workers=UPLOAD_WORKERS):
     """Upload all PDFs to the file search store"""
     pdf_files = sorted(SSO_DIR.glob("*.pdf"))
     print(f"\n=== Uploading {len(pdf_files)} PDFs ===")
@@ -79,48 +125,60 @@ def upload_documents(store):
     if not store.name:
         raise RuntimeError("Store has no name")
 
-    for pdf_path in pdf_files:
-        size_kb = pdf_path.stat().st_size // 1024
-        print(f"\n  {pdf_path.name} ({size_kb}KB)")
-
-        try:
-            # Use the upload_to_file_search_store method
-            # file parameter accepts path string directly
-            operation = client.file_search_stores.upload_to_file_search_store(
-                file_search_store_name=store.name,
-                file=str(pdf_path),
-                config=types.UploadToFileSearchStoreConfig(
-                    display_name=pdf_path.stem,
-                ),
-            )
-            print(
-                f"    -> Upload started: {operation.name if hasattr(operation, 'name') else 'OK'}"
-            )
-
-            # Wait for operation to complete if it's async
-            if hasattr(operation, "result"):
-                result = operation.result()
-                print(f"    -> Completed: {result}")
-
-        except Exception as e:
-            print(f"    -> ERROR: {e}")
+    # Uploads are network-bound, so run them concurrently; each file's
+    # output is printed as one block under a lock so lines don't interleave
+    print_lock = Lock()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_upload_one, pdf_path, store.name): pdf_path
+            for pdf_path in pdf_files
+        }
+        for future in as_completed(futures):
+            try:
+                lines = future.result()
+            except Exception as e:
+                lines = [f"\n  {futures[future].name}", f"    -> ERROR: {e}"]
+            with print_lock:
+                print("\n".join(lines))
 
     print("\n=== Upload Complete ===")
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Create Gemini File Search store for SSO Guidelines"
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Delete and rebuild the store if one already exists",
+    )
+    args = parser.parse_args()
+
     print("=" * 60)
     print("SSO Guidelines - Gemini File Search Store Creator")
     print("=" * 60)
 
-    # List existing stores
-    list_existing_stores()
+    # List existing stores and reuse ours if it is already there
+    stores = list_existing_stores()
+    existing = next((s for s in stores if s.display_name == STORE_DISPLAY_NAME), None)
+
+    if existing and not args.overwrite:
+        print("\nReusing existing store (pass --overwrite to rebuild it)")
+        store = existing
+    else:
+        if existing:
+            print(f"\n=== Deleting existing store {existing.name} ===")
+            client.file_search_stores.delete(
+                name=existing.name,
+                config=types.DeleteFileSearchStoreConfig(force=True),
+            )
 
-    # Create new store
-    store = create_store()
+        # Create new store
+        store = create_store()
 
-    # Upload documents
-    upload_documents(store)
+        # Upload documents
+        upload_documents(store)
 
     # Final summary
     store_id = store.name.split("/")[-1] if store.name else "unknown"
@@ -27,6 +27,13 @@ except ImportError:
     HAS_IMAGING = False
     print("Note: PIL/numpy not installed. Run: pip install pillow numpy")
 
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Output directories
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
@@ -118,8 +125,14 @@ def create_sample_imaging_manifest():
     manifest_path = PUBLIC_IMAGING / "manifest.json"
     manifest_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
+    # Compact manifest for the frontend, pretty copy for humans
+    pretty_path = manifest_path.with_name("manifest.pretty.json")
+    if HAS_ORJSON:
+        manifest_path.write_bytes(orjson.dumps(manifest))
+        pretty_path.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    else:
+        manifest_path.write_text(json.dumps(manifest, separators=(",", ":")))
+        pretty_path.write_text(json.dumps(manifest, indent=2))
 
     print(f"Created manifest at: {manifest_path}")
     return manifest
@@ -15,6 +15,8 @@ Usage:
 
 Requirements:
     pip3 install pillow requests numpy
+    pip3 install numba  # optional, much faster slice synthesis
+    pip3 install scipy  # optional, faster noise smoothing
 """
 
 import os
@@ -22,6 +24,9 @@ import sys
 import json
 import requests
 import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 
@@ -34,6 +39,38 @@ except ImportError:
     from PIL import Image
     import numpy as np
 
+# Optional: Numba compiles the slice compositor to a single parallel pass
+try:
+    from numba import njit, prange
+
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+# Optional: scipy's C Gaussian filter smooths the brain noise fastest
+try:
+    from scipy.ndimage import gaussian_filter1d
+
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+# Optional: orjson serializes manifests much faster than the stdlib
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Optional: OpenCV's PNG encoder is considerably faster than Pillow's
+try:
+    import cv2
+
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
 # Paths
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
@@ -79,309 +116,545 @@ SAMPLE_SOURCES = {
 }
 
 
+# Each slice is described as a stack of tissue layers, painted in order.
+# A layer is one row of floats: the tissue ellipse (cx, cy, half-width,
+# half-height), an ellipse cut out of it, an ellipse it is clipped to (both
+# unused when their half-width is 0), then the mode (0 = set to
+# base + smooth * smooth_scale + white * white_scale, 1 = multiply by base)
+# and the three value parameters.
+_NO_ELLIPSE = (0.0, 0.0, 0.0, 0.0)
+_SET, _SCALE = 0.0, 1.0
+# Half-height for vertical bands such as |x - cx| < a
+_BAND = 1e6
+
+
+def _layer(ellipse, base, smooth=0.0, white=0.0, exclude=None, clip=None, mode=_SET):
+    """Build one layer row (see the layout above)."""
+    return (
+        *ellipse,
+        *(exclude or _NO_ELLIPSE),
+        *(clip or _NO_ELLIPSE),
+        mode,
+        base,
+        smooth,
+        white,
+    )
+
+
+def _circle(cx: float, cy: float, r: float) -> Tuple[float, float, float, float]:
+    """Ellipse tuple for a circle of radius r."""
+    return (cx, cy, r, r)
+
+
+if HAS_NUMBA:
+
+    @njit(inline="always")
+    def _in_ellipse(cx, cy, ax, ay, x, y):
+        dx = (x - cx) / ax
+        dy = (y - cy) / ay
+        return dx * dx + dy * dy < 1.0
+
+    @njit(
+        "void(f4[:, ::1], f4[:, ::1], f4[:, ::1], uint8[:, ::1])",
+        parallel=True,
+        fastmath=True,
+        cache=True,
+    )
+    def _composite_numba(layers, smooth, white, out):
+        """Paint every layer and quantize to uint8 in one pass over the grid."""
+        h, w = out.shape
+        for i in prange(h):
+            y = np.float32(i)
+            for j in range(w):
+                x = np.float32(j)
+                v = np.float32(0.0)
+                for k in range(layers.shape[0]):
+                    L = layers[k]
+                    if not _in_ellipse(L[0], L[1], L[2], L[3], x, y):
+                        continue
+                    if L[6] > 0 and _in_ellipse(L[4], L[5], L[6], L[7], x, y):
+                        continue
+                    if L[10] > 0 and not _in_ellipse(L[8], L[9], L[10], L[11], x, y):
+                        continue
+                    if L[12] == _SCALE:
+                        v *= L[13]
+                    else:
+                        v = L[13] + L[14] * smooth[i, j] + L[15] * white[i, j]
+                v = min(max(v, np.float32(0.0)), np.float32(1.0))
+                out[i, j] = np.uint8(v * np.float32(255.0))
+
+
+@lru_cache(maxsize=128)
+def _ellipse_mask(cx, cy, ax, ay) -> np.ndarray:
+    """
+    Boolean mask of pixels strictly inside an axis-aligned ellipse.
+    Cached (read-only) so the fixed anatomy of a region is rasterized once
+    per series rather than once per slice.
+    """
+    dy2 = ((np.arange(TARGET_SIZE[0], dtype=np.float32) - cy) / ay) ** 2
+    dx2 = ((np.arange(TARGET_SIZE[1], dtype=np.float32) - cx) / ax) ** 2
+    mask = (dy2[:, None] + dx2[None, :]) < 1
+    mask.flags.writeable = False
+    return mask
+
+
+def _paint(img, mask, base, *terms, tmp=None):
+    """
+    Set img to base + sum(field * scale) wherever mask is True.
+    np.copyto fuses the select into one pass over the grid, with no
+    gather/scatter temporaries sized to the mask. `tmp` is an optional
+    full-size float32 scratch buffer reused across calls.
+    """
+    if not terms:
+        np.copyto(img, base, where=mask)
+        return
+    if tmp is None:
+        tmp = np.empty_like(img)
+    field, scale = terms[0]
+    np.multiply(field, scale, out=tmp)
+    for field, scale in terms[1:]:
+        tmp += field * scale
+    tmp += base
+    np.copyto(img, tmp, where=mask)
+
+
+def _is_flat(L) -> bool:
+    """True for a constant-valued layer with no cut-out (e.g. bowel loops)."""
+    return L[12] == _SET and L[6] == 0 and L[14] == 0 and L[15] == 0
+
+
+def _paint_flat_run(img, run):
+    """
+    Paint consecutive flat layers that share a clip ellipse in one pass.
+    Their masks are computed together as a (k, h, w) stack over the run's
+    bounding box; each pixel takes the base value of the last layer covering
+    it, as sequential painting would.
+    """
+    cx, cy, ax, ay = (run[:, c, None] for c in range(4))
+    y0 = max(int(np.floor((cy - ay).min())), 0)
+    y1 = min(int(np.ceil((cy + ay).max())) + 1, TARGET_SIZE[0])
+    x0 = max(int(np.floor((cx - ax).min())), 0)
+    x1 = min(int(np.ceil((cx + ax).max())) + 1, TARGET_SIZE[1])
+    if y0 >= y1 or x0 >= x1:
+        return
+    dy2 = ((np.arange(y0, y1, dtype=np.float32) - cy) / ay) ** 2
+    dx2 = ((np.arange(x0, x1, dtype=np.float32) - cx) / ax) ** 2
+    inside = (dy2[:, :, None] + dx2[:, None, :]) < 1
+    last = len(run) - 1 - np.argmax(inside[::-1], axis=0)
+    mask = inside.any(axis=0)
+    if run[0, 10] > 0:
+        mask &= _ellipse_mask(*run[0, 8:12])[y0:y1, x0:x1]
+    np.copyto(img[y0:y1, x0:x1], run[:, 13][last], where=mask)
+
+
+def _composite_numpy(layers, smooth, white, out):
+    """NumPy fallback for _composite_numba: one masked paint per layer."""
+    img = np.zeros(out.shape, dtype=np.float32)
+    tmp = np.empty_like(img)
+    k = 0
+    while k < len(layers):
+        L = layers[k]
+        k += 1
+        if _is_flat(L):
+            # Batch a run of flat layers sharing this clip into one paint
+            end = k
+            while (
+                end < len(layers)
+                and _is_flat(layers[end])
+                and np.array_equal(layers[end, 8:12], L[8:12])
+            ):
+                end += 1
+            if end > k:
+                _paint_flat_run(img, layers[k - 1 : end])
+                k = end
+                continue
+        mask = _ellipse_mask(*L[0:4])
+        if L[6] > 0:
+            mask = mask & ~_ellipse_mask(*L[4:8])
+        if L[10] > 0:
+            mask = mask & _ellipse_mask(*L[8:12])
+        if L[12] == _SCALE:
+            np.multiply(img, L[13], out=img, where=mask)
+        else:
+            terms = [(f, s) for f, s in ((smooth, L[14]), (white, L[15])) if s]
+            _paint(img, mask, L[13], *terms, tmp=tmp)
+    np.clip(img, 0, 1, out=img)
+    img *= 255
+    np.copyto(out, img, casting="unsafe")
+
+
+def render_layers(
+    layers: List[tuple],
+    smooth: np.ndarray,
+    white: np.ndarray,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Composite a layer stack into a uint8 slice (Numba when available)."""
+    # float32 throughout: the table's scalars would otherwise upcast every
+    # float32 field operation they touch
+    table = np.array(layers, dtype=np.float32).reshape(-1, 16)
+    if out is None:
+        out = np.empty(TARGET_SIZE, dtype=np.uint8)
+    if HAS_NUMBA:
+        _composite_numba(table, smooth, white, out)
+    else:
+        _composite_numpy(table, smooth, white, out)
+    return out
+
+
+@lru_cache(maxsize=None)
+def _gaussian_kernel1d(sigma: float, radius: int) -> np.ndarray:
+    """Normalized 1D Gaussian taps, computed once per (sigma, radius)."""
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    kernel /= kernel.sum()
+    kernel = kernel.astype(np.float32)
+    kernel.flags.writeable = False  # shared by every caller
+    return kernel
+
+
+def gaussian_blur(field: np.ndarray, sigma: float, truncate: float = 4.0) -> np.ndarray:
+    """
+    Separable Gaussian blur of a 2D float32 field.
+    Mirrors scipy.ndimage.gaussian_filter's defaults (reflect edges, taps out
+    to truncate * sigma) with one 1D pass per axis, using scipy's filter when
+    it is installed and the NumPy passes below otherwise.
+    """
+    if HAS_SCIPY:
+        field = gaussian_filter1d(field, sigma, axis=0, truncate=truncate)
+        return gaussian_filter1d(field, sigma, axis=1, truncate=truncate)
+
+    radius = int(truncate * sigma + 0.5)
+    kernel = _gaussian_kernel1d(float(sigma), radius)
+    tmp = np.empty_like(field)
+    for axis in (0, 1):
+        pad = [(0, 0), (0, 0)]
+        pad[axis] = (radius, radius)
+        padded = np.pad(field, pad, mode="symmetric")
+        n = field.shape[axis]
+        window = [slice(None), slice(None)]
+        blurred = np.zeros_like(field)
+        for t, weight in enumerate(kernel):
+            window[axis] = slice(t, t + n)
+            np.multiply(padded[tuple(window)], weight, out=tmp)
+            blurred += tmp
+        field = blurred
+    return field
+
+
+def _buffer(scratch: Optional[Dict], name: str, dtype) -> np.ndarray:
+    """
+    Slice-sized buffer `name` from `scratch`, allocated on first use.
+    Without a scratch dict every call gets a fresh array.
+    """
+    if scratch is None:
+        return np.empty(TARGET_SIZE, dtype=dtype)
+    buf = scratch.get(name)
+    if buf is None:
+        buf = scratch[name] = np.empty(TARGET_SIZE, dtype=dtype)
+    return buf
+
+
+def _begin_slice(
+    slice_idx: int, seed: int, scratch: Optional[Dict]
+) -> Tuple[np.random.Generator, np.ndarray]:
+    """
+    Per-slice RNG plus the white-noise field shared by all tissues; each
+    pixel keeps only the last tissue written to it, so the regions don't
+    need independent draws.
+    """
+    rng = np.random.default_rng(seed + slice_idx)
+    white = _buffer(scratch, "white", np.float32)
+    rng.standard_normal(out=white, dtype=np.float32)
+    return rng, white
+
+
 def create_realistic_brain_slice(
-    slice_idx: int, total_slices: int, seed: int = 42
+    slice_idx: int, total_slices: int, seed: int = 42, scratch: Optional[Dict] = None
 ) -> np.ndarray:
     """
     Generate a more realistic-looking brain MRI slice.
     Uses layered ellipses and noise to simulate brain anatomy.
+    With a `scratch` dict, its buffers are reused across calls and the
+    returned array is overwritten by the next slice rendered with it.
     """
-    np.random.seed(seed + slice_idx)
-
-    img = np.zeros((TARGET_SIZE[0], TARGET_SIZE[1]), dtype=np.float32)
+    rng, white = _begin_slice(slice_idx, seed, scratch)
 
-    # Create coordinate grids
-    y, x = np.ogrid[: TARGET_SIZE[0], : TARGET_SIZE[1]]
     center_y, center_x = TARGET_SIZE[0] // 2, TARGET_SIZE[1] // 2
 
     # Vary size based on slice position (smaller at top/bottom)
     z_factor = 1.0 - abs(slice_idx - total_slices / 2) / (total_slices / 2) * 0.3
 
-    # Skull (bright outer ring)
-    skull_outer = 200 * z_factor
-    skull_inner = 180 * z_factor
-    skull_mask_outer = ((x - center_x) ** 2 + (y - center_y) ** 2) < skull_outer**2
-    skull_mask_inner = ((x - center_x) ** 2 + (y - center_y) ** 2) < skull_inner**2
-    skull_mask = skull_mask_outer & ~skull_mask_inner
-    img[skull_mask] = 0.15 + np.random.randn(*img[skull_mask].shape) * 0.02
-
-    # CSF space (dark)
-    csf_radius = 175 * z_factor
-    csf_mask = ((x - center_x) ** 2 + (y - center_y) ** 2) < csf_radius**2
-    img[csf_mask] = 0.05 + np.random.randn(*img[csf_mask].shape) * 0.01
-
-    # Brain parenchyma (gray/white matter)
-    brain_radius = 165 * z_factor
-    brain_mask = ((x - center_x) ** 2 + (y - center_y) ** 2) < brain_radius**2
-
     # Create gyri pattern with perlin-like noise
     noise_scale = 0.05
-    noise = np.random.randn(TARGET_SIZE[0], TARGET_SIZE[1]) * noise_scale
+    noise = _buffer(scratch, "noise", np.float32)
+    rng.standard_normal(out=noise, dtype=np.float32)
+    noise *= noise_scale
     # Smooth the noise
-    from scipy.ndimage import gaussian_filter
+    noise = gaussian_blur(noise, sigma=8)
 
-    try:
-        noise = gaussian_filter(noise, sigma=8)
-    except:
-        pass  # Skip if scipy not available
-
-    # Gray matter (cortex) - outer ring of brain
+    skull_outer = 200 * z_factor
+    skull_inner = 180 * z_factor
+    csf_radius = 175 * z_factor
+    brain_radius = 165 * z_factor
     gm_inner = 130 * z_factor
-    gm_mask = brain_mask & (((x - center_x) ** 2 + (y - center_y) ** 2) >= gm_inner**2)
-    img[gm_mask] = (
-        0.45 + noise[gm_mask] * 2 + np.random.randn(*img[gm_mask].shape) * 0.03
-    )
 
-    # White matter (inner)
-    wm_mask = ((x - center_x) ** 2 + (y - center_y) ** 2) < gm_inner**2
-    img[wm_mask] = (
-        0.65 + noise[wm_mask] * 1.5 + np.random.randn(*img[wm_mask].shape) * 0.02
-    )
+    layers = [
+        # Skull (bright outer ring)
+        _layer(
+            _circle(center_x, center_y, skull_outer),
+            0.15,
+            white=0.02,
+            exclude=_circle(center_x, center_y, skull_inner),
+        ),
+        # CSF space (dark)
+        _layer(_circle(center_x, center_y, csf_radius), 0.05, white=0.01),
+        # Gray matter (cortex) - outer ring of brain parenchyma
+        _layer(
+            _circle(center_x, center_y, brain_radius),
+            0.45,
+            smooth=2,
+            white=0.03,
+            exclude=_circle(center_x, center_y, gm_inner),
+        ),
+        # White matter (inner)
+        _layer(_circle(center_x, center_y, gm_inner), 0.65, smooth=1.5, white=0.02),
+    ]
 
     # Ventricles (if in middle slices)
     if 0.3 < slice_idx / total_slices < 0.7:
         # Lateral ventricles (dark CSF-filled spaces)
         vent_size = 25 * (1 - abs(slice_idx / total_slices - 0.5) * 2)
         for ox in [-35, 35]:  # Left and right
-            vent_mask = (
-                (x - center_x - ox) ** 2 / (vent_size * 1.5) ** 2
-                + (y - center_y + 20) ** 2 / (vent_size * 0.8) ** 2
-            ) < 1
-            img[vent_mask] = 0.05 + np.random.randn(*img[vent_mask].shape) * 0.01
+            vent = (center_x + ox, center_y - 20, vent_size * 1.5, vent_size * 0.8)
+            layers.append(_layer(vent, 0.05, white=0.01))
 
     # Add tumor if in certain slices (for GBM case)
     if 0.35 < slice_idx / total_slices < 0.65:
         tumor_x = center_x - 50
         tumor_y = center_y + 20
         tumor_radius = 40 * (1 - abs(slice_idx / total_slices - 0.5) * 1.5)
+        tumor_outer = _circle(tumor_x, tumor_y, tumor_radius)
+        tumor_inner = _circle(tumor_x, tumor_y, tumor_radius * 0.6)
+
+        layers += [
+            # Enhancing rim (bright)
+            _layer(tumor_outer, 0.9, white=0.05, exclude=tumor_inner),
+            # Necrotic center (dark)
+            _layer(tumor_inner, 0.15, white=0.03),
+            # Perilesional edema - darken surrounding brain tissue
+            _layer(
+                _circle(tumor_x, tumor_y, tumor_radius * 2),
+                0.7,
+                exclude=tumor_outer,
+                clip=_circle(center_x, center_y, brain_radius),
+                mode=_SCALE,
+            ),
+        ]
+
+    return render_layers(layers, noise, white, out=_buffer(scratch, "img", np.uint8))
+
+
+@lru_cache(maxsize=None)
+def _ct_anatomy(body_region: str) -> Tuple[tuple, Tuple[tuple, ...]]:
+    """
+    Slice-invariant geometry of a CT region: its body outline and the
+    anatomy layers drawn on every slice. Built once per region; only the
+    lesions (sized by slice position) and bowel loops vary per slice.
+    """
+    center_y, center_x = TARGET_SIZE[0] // 2, TARGET_SIZE[1] // 2
 
-        # Tumor with ring enhancement
-        tumor_outer = ((x - tumor_x) ** 2 + (y - tumor_y) ** 2) < tumor_radius**2
-        tumor_inner = ((x - tumor_x) ** 2 + (y - tumor_y) ** 2) < (
-            tumor_radius * 0.6
-        ) ** 2
+    if body_region == "thorax":
+        # CT Chest - lungs appear dark, tissue appears gray
+        body = (center_x, center_y, 200, 150)
+        layers = (
+            # Body outline (ellipse)
+            _layer(body, 0.4, white=0.02),
+            # Lungs (dark) - two ellipses with some texture
+            _layer((center_x - 70, center_y, 70, 100), 0.08, white=0.03),
+            _layer((center_x + 70, center_y, 70, 100), 0.08, white=0.03),
+            # Mediastinum (between lungs)
+            _layer((center_x, center_y, 40, _BAND), 0.45, white=0.02, clip=body),
+            # Spine (bright bone at back)
+            _layer((center_x, center_y + 100, 20, 15), 0.85, white=0.02),
+        )
 
-        # Enhancing rim (bright)
-        rim_mask = tumor_outer & ~tumor_inner
-        img[rim_mask] = 0.9 + np.random.randn(*img[rim_mask].shape) * 0.05
+    elif body_region == "abdomen":
+        # CT Abdomen
+        body = (center_x, center_y, 180, 140)
+        layers = (
+            _layer(body, 0.4, white=0.02),
+            # Liver (right side, large)
+            _layer((center_x + 60, center_y - 20, 80, 60), 0.5, white=0.02, clip=body),
+            # Spleen (left side)
+            _layer((center_x - 80, center_y - 10, 40, 35), 0.55, white=0.02),
+            # Spine
+            _layer((center_x, center_y + 80, 20, 15), 0.85),
+        )
+
+    elif body_region == "pelvis":
+        # CT Pelvis
+        body = (center_x, center_y, 190, 130)
+        layers = (
+            _layer(body, 0.4, white=0.02),
+            # Iliac bones (bilateral)
+            _layer((center_x - 90, center_y + 30, 50, 80), 0.85, white=0.02),
+            _layer((center_x + 90, center_y + 30, 50, 80), 0.85, white=0.02),
+            # Sacrum
+            _layer((center_x, center_y + 70, 40, 30), 0.8),
+            # Bladder (dark fluid)
+            _layer((center_x, center_y - 30, 40, 35), 0.15),
+            # Rectum
+            _layer((center_x, center_y + 20, 25, 30), 0.3),
+        )
 
-        # Necrotic center (dark)
-        img[tumor_inner] = 0.15 + np.random.randn(*img[tumor_inner].shape) * 0.03
+    elif body_region == "head_neck":
+        # CT Head/Neck
+        body = _circle(center_x, center_y, 180)
+        layers = (
+            # Head outline
+            _layer(body, 0.4, white=0.02),
+            # Skull
+            _layer(
+                _circle(center_x, center_y, 175),
+                0.85,
+                exclude=_circle(center_x, center_y, 160),
+            ),
+            # Airway (dark)
+            _layer((center_x, center_y - 40, 30, 20), 0.05),
+            # Oral cavity
+            _layer((center_x, center_y - 60, 50, 30), 0.15),
+        )
 
-        # Perilesional edema
-        edema_mask = (
-            ((x - tumor_x) ** 2 + (y - tumor_y) ** 2) < (tumor_radius * 2) ** 2
-        ) & ~tumor_outer
-        edema_mask = edema_mask & brain_mask
-        img[edema_mask] = img[edema_mask] * 0.7  # Darken surrounding tissue
+    else:
+        # Generic soft tissue CT
+        body = (center_x, center_y, 180, 140)
+        layers = (_layer(body, 0.4, white=0.02),)
 
-    # Normalize and convert to uint8
-    img = np.clip(img, 0, 1)
-    return (img * 255).astype(np.uint8)
+    return body, layers
 
 
 def create_realistic_ct_slice(
-    body_region: str, slice_idx: int, total_slices: int, seed: int = 42
+    body_region: str,
+    slice_idx: int,
+    total_slices: int,
+    seed: int = 42,
+    scratch: Optional[Dict] = None,
 ) -> np.ndarray:
     """
     Generate a more realistic-looking CT slice for different body regions.
+    `scratch` behaves as in create_realistic_brain_slice.
     """
-    np.random.seed(seed + slice_idx)
+    rng, white = _begin_slice(slice_idx, seed, scratch)
 
-    img = np.zeros((TARGET_SIZE[0], TARGET_SIZE[1]), dtype=np.float32)
-    y, x = np.ogrid[: TARGET_SIZE[0], : TARGET_SIZE[1]]
     center_y, center_x = TARGET_SIZE[0] // 2, TARGET_SIZE[1] // 2
 
-    # Base noise
-    base_noise = np.random.randn(TARGET_SIZE[0], TARGET_SIZE[1]) * 0.02
+    body, anatomy = _ct_anatomy(body_region)
+    layers = list(anatomy)
 
     if body_region == "thorax":
-        # CT Chest - lungs appear dark, tissue appears gray
-
-        # Body outline (ellipse)
-        body_a, body_b = 200, 150
-        body_mask = (
-            (x - center_x) ** 2 / body_a**2 + (y - center_y) ** 2 / body_b**2
-        ) < 1
-        img[body_mask] = 0.4 + base_noise[body_mask]
-
-        # Lungs (dark) - two ellipses
-        for ox, sign in [(-70, 1), (70, -1)]:
-            lung_a, lung_b = 70, 100
-            lung_mask = (
-                (x - center_x - ox) ** 2 / lung_a**2 + (y - center_y) ** 2 / lung_b**2
-            ) < 1
-            # Add some texture to lungs
-            lung_texture = np.random.randn(*img.shape) * 0.03
-            img[lung_mask] = 0.08 + lung_texture[lung_mask]
-
-        # Mediastinum (between lungs)
-        med_mask = (abs(x - center_x) < 40) & body_mask
-        img[med_mask] = 0.45 + base_noise[med_mask]
-
-        # Spine (bright bone at back)
-        spine_mask = (
-            (x - center_x) ** 2 / 20**2 + (y - center_y - 100) ** 2 / 15**2
-        ) < 1
-        img[spine_mask] = 0.85 + np.random.randn(*img[spine_mask].shape) * 0.02
-
         # Add lung tumor if in middle slices
         if 0.3 < slice_idx / total_slices < 0.7:
-            tumor_x = center_x + 80
-            tumor_y = center_y - 40
             tumor_r = 30 * (1 - abs(slice_idx / total_slices - 0.5))
-            tumor_mask = ((x - tumor_x) ** 2 + (y - tumor_y) ** 2) < tumor_r**2
             # Spiculated appearance
-            spic_noise = np.random.randn(*img.shape) * 0.1
-            img[tumor_mask] = 0.5 + spic_noise[tumor_mask]
+            tumor = _circle(center_x + 80, center_y - 40, tumor_r)
+            layers.append(_layer(tumor, 0.5, white=0.1))
 
     elif body_region == "abdomen":
-        # CT Abdomen
-        body_a, body_b = 180, 140
-        body_mask = (
-            (x - center_x) ** 2 / body_a**2 + (y - center_y) ** 2 / body_b**2
-        ) < 1
-        img[body_mask] = 0.4 + base_noise[body_mask]
-
-        # Liver (right side, large)
-        liver_mask = (
-            (x - center_x - 60) ** 2 / 80**2 + (y - center_y + 20) ** 2 / 60**2
-        ) < 1
-        liver_mask = liver_mask & body_mask
-        img[liver_mask] = 0.5 + np.random.randn(*img[liver_mask].shape) * 0.02
-
-        # Spleen (left side)
-        spleen_mask = (
-            (x - center_x + 80) ** 2 / 40**2 + (y - center_y + 10) ** 2 / 35**2
-        ) < 1
-        img[spleen_mask] = 0.55 + np.random.randn(*img[spleen_mask].shape) * 0.02
-
-        # Spine
-        spine_mask = (
-            (x - center_x) ** 2 / 20**2 + (y - center_y - 80) ** 2 / 15**2
-        ) < 1
-        img[spine_mask] = 0.85
-
         # Bowel loops (varied density)
-        for _ in range(5):
-            bx = center_x + np.random.randint(-50, 50)
-            by = center_y + np.random.randint(-30, 60)
-            br = np.random.randint(15, 30)
-            bowel_mask = ((x - bx) ** 2 + (y - by) ** 2) < br**2
-            bowel_mask = bowel_mask & body_mask
-            img[bowel_mask] = 0.25 + np.random.rand() * 0.2
+        bxs = center_x + rng.integers(-50, 50, 5)
+        bys = center_y + rng.integers(-30, 60, 5)
+        brs = rng.integers(15, 30, 5)
+        densities = 0.25 + rng.random(5) * 0.2
+        for bx, by, br, density in zip(bxs, bys, brs, densities):
+            layers.append(_layer(_circle(bx, by, br), density, clip=body))
 
         # Add liver metastasis if applicable
         if 0.35 < slice_idx / total_slices < 0.65:
-            met_x = center_x + 70
-            met_y = center_y
             met_r = 20 * (1 - abs(slice_idx / total_slices - 0.5) * 1.5)
-            met_mask = ((x - met_x) ** 2 + (y - met_y) ** 2) < met_r**2
-            img[met_mask] = 0.35  # Hypodense lesion
+            # Hypodense lesion
+            layers.append(_layer(_circle(center_x + 70, center_y, met_r), 0.35))
 
     elif body_region == "pelvis":
-        # CT Pelvis
-        body_a, body_b = 190, 130
-        body_mask = (
-            (x - center_x) ** 2 / body_a**2 + (y - center_y) ** 2 / body_b**2
-        ) < 1
-        img[body_mask] = 0.4 + base_noise[body_mask]
-
-        # Iliac bones (bilateral)
-        for ox in [-90, 90]:
-            bone_mask = (
-                (x - center_x - ox) ** 2 / 50**2 + (y - center_y - 30) ** 2 / 80**2
-            ) < 1
-            img[bone_mask] = 0.85 + np.random.randn(*img[bone_mask].shape) * 0.02
-
-        # Sacrum
-        sacrum_mask = (
-            (x - center_x) ** 2 / 40**2 + (y - center_y - 70) ** 2 / 30**2
-        ) < 1
-        img[sacrum_mask] = 0.8
-
-        # Bladder (dark fluid)
-        bladder_mask = (
-            (x - center_x) ** 2 / 40**2 + (y - center_y + 30) ** 2 / 35**2
-        ) < 1
-        img[bladder_mask] = 0.15
-
-        # Rectum
-        rectum_mask = (
-            (x - center_x) ** 2 / 25**2 + (y - center_y - 20) ** 2 / 30**2
-        ) < 1
-        img[rectum_mask] = 0.3
-
         # Add pelvic mass
         if 0.3 < slice_idx / total_slices < 0.7:
             mass_r = 35 * (1 - abs(slice_idx / total_slices - 0.5))
-            mass_mask = ((x - center_x) ** 2 + (y - center_y + 10) ** 2) < mass_r**2
-            img[mass_mask] = 0.5 + np.random.randn(*img[mass_mask].shape) * 0.05
+            mass = _circle(center_x, center_y - 10, mass_r)
+            layers.append(_layer(mass, 0.5, white=0.05))
 
     elif body_region == "head_neck":
-        # CT Head/Neck
-        # Head outline
-        head_r = 180
-        head_mask = ((x - center_x) ** 2 + (y - center_y) ** 2) < head_r**2
-        img[head_mask] = 0.4 + base_noise[head_mask]
-
-        # Skull
-        skull_outer = 175
-        skull_inner = 160
-        skull_mask = (((x - center_x) ** 2 + (y - center_y) ** 2) < skull_outer**2) & (
-            ((x - center_x) ** 2 + (y - center_y) ** 2) >= skull_inner**2
-        )
-        img[skull_mask] = 0.85
-
-        # Airway (dark)
-        airway_mask = (
-            (x - center_x) ** 2 / 30**2 + (y - center_y + 40) ** 2 / 20**2
-        ) < 1
-        img[airway_mask] = 0.05
-
-        # Oral cavity
-        oral_mask = ((x - center_x) ** 2 / 50**2 + (y - center_y + 60) ** 2 / 30**2) < 1
-        img[oral_mask] = 0.15
-
         # Add tumor in buccal region
         if 0.35 < slice_idx / total_slices < 0.65:
-            tumor_x = center_x + 60
-            tumor_y = center_y + 40
             tumor_r = 30 * (1 - abs(slice_idx / total_slices - 0.5))
-            tumor_mask = ((x - tumor_x) ** 2 + (y - tumor_y) ** 2) < tumor_r**2
-            img[tumor_mask] = 0.55 + np.random.randn(*img[tumor_mask].shape) * 0.03
+            tumor = _circle(center_x + 60, center_y + 40, tumor_r)
+            layers.append(_layer(tumor, 0.55, white=0.03))
+
+    return render_layers(layers, white, white, out=_buffer(scratch, "img", np.uint8))
+
 
+def _as_pil(img_array: np.ndarray) -> Image.Image:
+    """Wrap a uint8 grayscale slice as a PIL image without copying it."""
+    img_array = np.ascontiguousarray(img_array, dtype=np.uint8)
+    h, w = img_array.shape
+    return Image.frombuffer("L", (w, h), img_array, "raw", "L", 0, 1)
+
+
+def save_png(img_array: np.ndarray, filepath: Path) -> None:
+    """Write a uint8 grayscale slice as PNG using the fastest zlib setting."""
+    if HAS_CV2:
+        cv2.imwrite(str(filepath), img_array, [cv2.IMWRITE_PNG_COMPRESSION, 1])
     else:
-        # Generic soft tissue CT
-        body_mask = ((x - center_x) ** 2 / 180**2 + (y - center_y) ** 2 / 140**2) < 1
-        img[body_mask] = 0.4 + base_noise[body_mask]
+        _as_pil(img_array).save(filepath, optimize=False, compress_level=1)
 
-    # Normalize
-    img = np.clip(img, 0, 1)
-    return (img * 255).astype(np.uint8)
+
+# Buffers reused by every slice one worker process renders (see _render_one)
+_WORKER_SCRATCH: Dict[str, np.ndarray] = {}
+
+
+def _render_one(job: Tuple[str, int, int, Path]) -> str:
+    """
+    Render and save a single slice.
+    Kept at module level so ProcessPoolExecutor can pickle it. Each worker
+    renders its slices one at a time, so they can share one scratch dict.
+    """
+    body_region, i, total_slices, output_dir = job
+    scratch = _WORKER_SCRATCH
+
+    if body_region == "brain":
+        img_array = create_realistic_brain_slice(
+            i, total_slices, seed=42, scratch=scratch
+        )
+    else:
+        img_array = create_realistic_ct_slice(
+            body_region, i, total_slices, seed=42, scratch=scratch
+        )
+
+    filename = f"slice_{i:03d}.png"
+    save_png(img_array, output_dir / filename)
+    return filename
 
 
 def generate_series(body_region: str, output_dir: Path, config: Dict) -> List[str]:
     """Generate a realistic image series for a body region."""
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    files = []
     total_slices = config.get("slices", NUM_SLICES)
 
     print(f"  Generating {total_slices} slices...")
 
-    for i in range(total_slices):
-        if body_region == "brain":
-            img_array = create_realistic_brain_slice(i, total_slices, seed=42)
-        else:
-            img_array = create_realistic_ct_slice(body_region, i, total_slices, seed=42)
-
-        # Save as PNG
-        img = Image.fromarray(img_array, mode="L")
-        filename = f"slice_{i:03d}.png"
-        filepath = output_dir / filename
-        img.save(filepath, optimize=True)
-        files.append(filename)
+    # Slices are independent (each seeds from its own index), so render
+    # them across all cores; map() keeps the file list in slice order.
+    # Spawn rather than fork: the parallel Numba kernel starts its thread
+    # pool at import, and forked copies of it hang on exit
+    workers = os.cpu_count() or 1
+    jobs = [(body_region, i, total_slices, output_dir) for i in range(total_slices)]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        files = list(
+            executor.map(
+                _render_one, jobs, chunksize=max(1, total_slices // (4 * workers))
+            )
+        )
 
     return files
 
@@ -403,8 +676,10 @@ def generate_manifest(
     }
 
     manifest_path = output_dir / "manifest.json"
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
+    if HAS_ORJSON:
+        manifest_path.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    else:
+        manifest_path.write_text(json.dumps(manifest, indent=2))
 
 
 def main():
@@ -14,13 +14,24 @@ import os
 import sys
 import json
 import zipfile
-import tempfile
 import shutil
+import contextlib
+import hashlib
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
 
 import numpy as np
-from PIL import Image
+
+from _imaging_core import (
+    cached_slices,
+    compute_norm,
+    slice_cache_key,
+    window_u8,
+    write_pngs,
+)
 
 try:
     import pydicom
@@ -35,11 +46,16 @@ except ImportError:
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 DATA_DIR = SCRIPT_DIR / "real_data"
+CACHE_DIR = DATA_DIR / "cache"
 PUBLIC_DIR = PROJECT_ROOT / "apps" / "web" / "public" / "imaging"
 
 # Target settings
-TARGET_SIZE = (512, 512)
 NUM_SLICES = 50
+DICOM_READ_WORKERS = 8
+# "DICM" marker at byte 128 of a DICOM Part 10 file
+DICOM_MAGIC = b"DICM"
+# Tags the header pass reads: the sort keys, plus Rows to spot images
+HEADER_TAGS = ["InstanceNumber", "SliceLocation", "Rows"]
 
 # Case mappings - DICOM zip to output folder and case info
 CASE_MAPPINGS = {
@@ -146,35 +162,112 @@ CASE_MAPPINGS = {
 }
 
 
+def _shift_int16(volume: np.ndarray, intercepts: np.ndarray) -> np.ndarray:
+    """
+    Add integer intercepts (broadcast per slice) in int16, widening to int32
+    only if the raw or shifted range would overflow.
+    """
+    info = np.iinfo(np.int16)
+    lo, hi = int(volume.min()), int(volume.max())
+    fits = (
+        info.min <= min(lo, lo + int(intercepts.min()))
+        and max(hi, hi + int(intercepts.max())) <= info.max
+    )
+    shifted = volume.astype(np.int16 if fits else np.int32)
+    shifted += intercepts.astype(shifted.dtype)
+    return shifted
+
+
+def _slice_key(ds) -> float:
+    """Sort by instance number or slice location."""
+    if hasattr(ds, "InstanceNumber"):
+        return int(ds.InstanceNumber)
+    elif hasattr(ds, "SliceLocation"):
+        return float(ds.SliceLocation)
+    return 0
+
+
+def _read_sorted(sources: List[Tuple[str, Callable]]) -> List[Tuple]:
+    """
+    Read (name, opener) sources as slice-ordered (name, dataset) pairs.
+    A cheap header pass (no pixel data, only the sort tags) finds and orders
+    the image slices; only those are then read in full.
+    """
+
+    def header(source):
+        name, opener = source
+        try:
+            with opener() as fh:
+                # Anything but *.dcm must carry the Part 10 magic; names alone
+                # can't tell (series are often named by dotted UIDs), and
+                # XML/PDF sidecars are rejected without a parse attempt
+                if not str(name).endswith(".dcm"):
+                    if fh.read(132)[128:] != DICOM_MAGIC:
+                        return None
+                    fh.seek(0)
+                ds = pydicom.dcmread(
+                    fh,
+                    stop_before_pixels=True,
+                    specific_tags=HEADER_TAGS,
+                    force=True,
+                )
+        except Exception:
+            return None
+        # Rows is mandatory for images; it screens out non-image objects
+        return (source, _slice_key(ds)) if "Rows" in ds else None
+
+    def full(source):
+        name, opener = source
+        try:
+            with opener() as fh:
+                ds = pydicom.dcmread(io.BytesIO(fh.read()), force=True)
+            if hasattr(ds, "pixel_array"):
+                return name, ds
+        except Exception:
+            pass
+        return None
+
+    with ThreadPoolExecutor(max_workers=DICOM_READ_WORKERS) as executor:
+        headers = [h for h in executor.map(header, sources) if h]
+        headers.sort(key=lambda h: h[1])
+        loaded = executor.map(full, [source for source, _ in headers])
+        return [item for item in loaded if item]
+
+
 def read_dicom_series(dicom_dir: Path) -> Tuple[np.ndarray, Dict]:
     """Read all DICOM files in a directory and return 3D volume."""
-    dicom_files = []
+    sources = []
 
-    # Find all DICOM files
+    # Every file is a candidate; _read_sorted keeps the DICOM ones
     for root, dirs, files in os.walk(dicom_dir):
         for f in files:
-            if f.endswith(".dcm") or not "." in f:
-                filepath = Path(root) / f
-                try:
-                    ds = pydicom.dcmread(str(filepath), force=True)
-                    if hasattr(ds, "pixel_array"):
-                        dicom_files.append((filepath, ds))
-                except:
-                    continue
+            filepath = Path(root) / f
+            sources.append((filepath, lambda fp=filepath: open(fp, "rb")))
 
-    if not dicom_files:
-        return None, {}
+    return _assemble_series(_read_sorted(sources))
 
-    # Sort by instance number or slice location
-    def get_slice_key(item):
-        ds = item[1]
-        if hasattr(ds, "InstanceNumber"):
-            return int(ds.InstanceNumber)
-        elif hasattr(ds, "SliceLocation"):
-            return float(ds.SliceLocation)
-        return 0
 
-    dicom_files.sort(key=get_slice_key)
+def read_dicom_zip(zip_path: Path) -> Tuple[np.ndarray, Dict]:
+    """
+    Read a DICOM series straight out of a zip, without extracting it.
+    Entries are inflated and parsed on a thread pool (zlib and pixel
+    decoding release the GIL).
+    """
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        sources = [
+            (e.filename, lambda e=e: zf.open(e))
+            for e in zf.infolist()
+            if not e.is_dir()
+        ]
+        dicom_files = _read_sorted(sources)
+
+    return _assemble_series(dicom_files)
+
+
+def _assemble_series(dicom_files: List[Tuple]) -> Tuple[np.ndarray, Dict]:
+    """Stack slice-ordered (path, dataset) pairs into a 3D volume + metadata."""
+    if not dicom_files:
+        return None, {}
 
     # Extract metadata from first slice
     first_ds = dicom_files[0][1]
@@ -190,42 +283,111 @@ def read_dicom_series(dicom_dir: Path) -> Tuple[np.ndarray, Dict]:
         "num_slices": len(dicom_files),
     }
 
-    # Build 3D volume
-    slices = []
+    # Build 3D volume: decode every slice into one preallocated buffer in
+    # its stored integer dtype, then rescale the whole cube at once
+    volume = None
+    slopes, intercepts = [], []
     for filepath, ds in dicom_files:
         try:
-            # Apply VOI LUT for proper windowing
-            pixel_array = ds.pixel_array.astype(np.float32)
-
-            # Apply rescale slope/intercept for CT
-            if hasattr(ds, "RescaleSlope") and hasattr(ds, "RescaleIntercept"):
-                pixel_array = pixel_array * float(ds.RescaleSlope) + float(
-                    ds.RescaleIntercept
+            pixel_array = ds.pixel_array
+            if volume is None:
+                volume = np.empty(
+                    (len(dicom_files),) + pixel_array.shape, dtype=pixel_array.dtype
                 )
-
-            slices.append(pixel_array)
+            elif pixel_array.shape != volume.shape[1:]:
+                # e.g. a localizer mixed into the series
+                print(
+                    f"  Warning: Skipping {filepath}: slice shape "
+                    f"{pixel_array.shape} does not match series {volume.shape[1:]}"
+                )
+                continue
+            elif not np.can_cast(pixel_array.dtype, volume.dtype):
+                print(
+                    f"  Warning: Skipping {filepath}: {pixel_array.dtype} pixels "
+                    f"do not fit the series' {volume.dtype}"
+                )
+                continue
+            volume[len(slopes)] = pixel_array
         except Exception as e:
             print(f"  Warning: Could not read {filepath}: {e}")
             continue
 
-    if not slices:
+        # Rescale slope/intercept for CT
+        if hasattr(ds, "RescaleSlope") and hasattr(ds, "RescaleIntercept"):
+            slopes.append(float(ds.RescaleSlope))
+            intercepts.append(float(ds.RescaleIntercept))
+        else:
+            slopes.append(1.0)
+            intercepts.append(0.0)
+
+    if not slopes:
         return None, metadata
 
-    volume = np.stack(slices, axis=0)
+    volume = volume[: len(slopes)]
+    slopes = np.array(slopes, dtype=np.float32)[:, None, None]
+    intercepts = np.array(intercepts)[:, None, None]
+
+    if np.any(slopes != 1) or np.any(intercepts % 1):
+        volume = volume.astype(np.float32)
+        volume *= slopes
+        volume += intercepts.astype(np.float32)
+    elif np.any(intercepts):
+        volume = _shift_int16(volume, intercepts.astype(np.int64))
+
     return volume, metadata
 
 
 def apply_window(volume: np.ndarray, center: float, width: float) -> np.ndarray:
     """Apply CT windowing."""
-    min_val = center - width / 2
-    max_val = center + width / 2
-    windowed = np.clip(volume, min_val, max_val)
-    normalized = (windowed - min_val) / (max_val - min_val)
-    return (normalized * 255).astype(np.uint8)
-
-
-def process_dicom_zip(zip_path: Path, config: Dict) -> bool:
-    """Process a DICOM zip file and create PNG slices."""
+    return window_u8(volume, center - width / 2, center + width / 2)
+
+
+def _cache_paths(zip_path: Path) -> Tuple[Path, Path]:
+    """Cache file paths for a zip, keyed on (path, mtime, size)."""
+    st = zip_path.stat()
+    key = f"{zip_path.resolve()}:{st.st_mtime_ns}:{st.st_size}"
+    stem = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return CACHE_DIR / f"{stem}.npy", CACHE_DIR / f"{stem}.json"
+
+
+def _load_cached_series(zip_path: Path) -> Optional[Tuple[np.ndarray, Dict]]:
+    """Return (memory-mapped volume, metadata) if this zip was decoded before."""
+    volume_path, meta_path = _cache_paths(zip_path)
+    if not (volume_path.exists() and meta_path.exists()):
+        return None
+    with open(meta_path) as f:
+        metadata = json.load(f)
+    return np.load(volume_path, mmap_mode="r"), metadata
+
+
+def _save_cached_series(zip_path: Path, volume: np.ndarray, metadata: Dict) -> None:
+    """Persist a decoded series so later runs skip extraction and parsing."""
+    volume_path, meta_path = _cache_paths(zip_path)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    # pydicom value types (DSfloat etc.) are kept as their string form
+    meta = {k: v if type(v) in (int, str) else str(v) for k, v in metadata.items()}
+
+    # Write then rename so an interrupted run never leaves a torn cache;
+    # the volume lands last since its presence gates the cache hit
+    tmp_path = meta_path.with_name(meta_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+    tmp_path = volume_path.with_name(volume_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, volume)
+    os.replace(tmp_path, volume_path)
+
+
+def process_dicom_zip(
+    zip_path: Path, config: Dict, encode_workers: Optional[int] = None
+) -> bool:
+    """
+    Process a DICOM zip file and create PNG slices.
+    encode_workers=1 encodes inline (used when cases already run in a pool).
+    """
     print(f"\n{'=' * 60}")
     print(f"Processing: {zip_path.name}")
     print(f"Cancer Type: {config['cancer_type']}")
@@ -234,98 +396,100 @@ def process_dicom_zip(zip_path: Path, config: Dict) -> bool:
     output_dir = PUBLIC_DIR / config["output_folder"]
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Extract zip to temp directory
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_path = Path(temp_dir)
+    # Skip the case outright, before any decode, when the last run's slices
+    # came from the same zip and window; its manifest is kept as is
+    window = config["window"]
+    cache_key = slice_cache_key(zip_path, window, NUM_SLICES)
+    files = cached_slices(output_dir, cache_key)
+    if files is not None:
+        print(f"  Slices are up to date, skipping ({len(files)} in {output_dir})")
+        return True
 
-        print(f"  Extracting DICOM files...")
+    cached = _load_cached_series(zip_path)
+    if cached is not None:
+        print(f"  Using cached volume")
+        volume, metadata = cached
+    else:
+        # Read DICOM series straight from the zip
+        print(f"  Reading DICOM series...")
         try:
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                zf.extractall(temp_path)
-        except Exception as e:
-            print(f"  ERROR: Could not extract zip: {e}")
+            volume, metadata = read_dicom_zip(zip_path)
+        except (zipfile.BadZipFile, OSError) as e:
+            print(f"  ERROR: Could not read zip: {e}")
             return False
 
-        # Read DICOM series
-        print(f"  Reading DICOM series...")
-        volume, metadata = read_dicom_series(temp_path)
-
         if volume is None:
             print(f"  ERROR: No valid DICOM data found")
             return False
 
-        print(f"  Volume shape: {volume.shape}")
-        print(f"  Value range: {volume.min():.1f} to {volume.max():.1f}")
-        print(
-            f"  Metadata: {metadata.get('modality', 'Unknown')} - {metadata.get('body_part', 'Unknown')}"
-        )
-
-        # Apply windowing
-        window = config["window"]
-        print(f"  Applying window: C={window['center']}, W={window['width']}")
-
-        # For MRI, use percentile normalization instead
-        if config["modality"] == "MR":
-            p1, p99 = (
-                np.percentile(volume[volume > 0], [1, 99])
-                if np.any(volume > 0)
-                else (0, 1)
-            )
-            volume_windowed = np.clip(volume, p1, p99)
-            volume_windowed = ((volume_windowed - p1) / (p99 - p1) * 255).astype(
-                np.uint8
-            )
-        else:
-            volume_windowed = apply_window(volume, window["center"], window["width"])
-
-        # Select slices
-        total_slices = volume_windowed.shape[0]
-        start = int(total_slices * 0.15)
-        end = int(total_slices * 0.85)
-        indices = np.linspace(start, end, NUM_SLICES, dtype=int)
-
-        print(f"  Extracting {NUM_SLICES} slices from {total_slices} total...")
-
-        files = []
-        for i, idx in enumerate(indices):
-            slice_data = volume_windowed[idx]
-
-            # Resize to target
-            img = Image.fromarray(slice_data, mode="L")
-            img = img.resize(TARGET_SIZE, Image.Resampling.LANCZOS)
-
-            # Save
-            filename = f"slice_{i:03d}.png"
-            img.save(output_dir / filename, optimize=True)
-            files.append(filename)
-
-        # Create manifest with REAL metadata
-        manifest = {
-            "version": "1.0",
-            "numSlices": len(files),
-            "sliceFiles": files,
-            "bodyRegion": config["body_region"],
-            "window": window,
-            "modality": config["modality"],
-            "description": config["description"],
-            "cancerType": config["cancer_type"],
-            "source": config["source"],
-            "synthetic": False,
-            "license": "TCIA Data Usage Policy",
-            "dicomMetadata": {
-                "patientId": metadata.get("patient_id", "Anonymous"),
-                "studyDate": metadata.get("study_date", "Unknown"),
-                "manufacturer": metadata.get("manufacturer", "Unknown"),
-                "sliceThickness": str(metadata.get("slice_thickness", "Unknown")),
-                "originalSlices": metadata.get("num_slices", 0),
-            },
-        }
-
-        with open(output_dir / "manifest.json", "w") as f:
-            json.dump(manifest, f, indent=2)
-
-        print(f"  ✓ Generated {len(files)} PNG slices in {output_dir}")
-        return True
+        _save_cached_series(zip_path, volume, metadata)
+
+    print(f"  Volume shape: {volume.shape}")
+    print(f"  Value range: {volume.min():.1f} to {volume.max():.1f}")
+    print(
+        f"  Metadata: {metadata.get('modality', 'Unknown')} - {metadata.get('body_part', 'Unknown')}"
+    )
+
+    # Apply windowing
+    print(f"  Applying window: C={window['center']}, W={window['width']}")
+
+    # Select slices
+    total_slices = volume.shape[0]
+    start = int(total_slices * 0.15)
+    end = int(total_slices * 0.85)
+    indices = np.linspace(start, end, NUM_SLICES, dtype=int)
+
+    print(f"  Extracting {NUM_SLICES} slices from {total_slices} total...")
+
+    # Range from the whole volume (window for CT, foreground percentiles
+    # for MRI), but only the selected slices are converted to 8 bits
+    norm_window = None if config["modality"] == "MR" else window
+    lo, hi = compute_norm(volume, norm_window)
+    volume_windowed = window_u8(volume[indices], lo, hi)
+
+    # Resizing and PNG encoding are CPU-bound and independent per slice
+    files = write_pngs(volume_windowed, output_dir, workers=encode_workers)
+
+    # Create manifest with REAL metadata
+    manifest = {
+        "version": "1.0",
+        "numSlices": len(files),
+        "sliceFiles": files,
+        "bodyRegion": config["body_region"],
+        "window": window,
+        "modality": config["modality"],
+        "description": config["description"],
+        "cancerType": config["cancer_type"],
+        "source": config["source"],
+        "synthetic": False,
+        "license": "TCIA Data Usage Policy",
+        "dicomMetadata": {
+            "patientId": metadata.get("patient_id", "Anonymous"),
+            "studyDate": metadata.get("study_date", "Unknown"),
+            "manufacturer": metadata.get("manufacturer", "Unknown"),
+            "sliceThickness": str(metadata.get("slice_thickness", "Unknown")),
+            "originalSlices": metadata.get("num_slices", 0),
+        },
+        "cacheKey": cache_key,
+    }
+
+    with open(output_dir / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"  ✓ Generated {len(files)} PNG slices in {output_dir}")
+    return True
+
+
+def _process_case(job: Tuple[str, Dict]) -> Tuple[bool, str]:
+    """
+    Process one case in a worker process; returns (ok, captured log) so the
+    parent can print each case's output as one block.
+    """
+    zip_name, config = job
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        ok = process_dicom_zip(DATA_DIR / zip_name, config, encode_workers=1)
+    return ok, log.getvalue()
 
 
 def main():
@@ -338,6 +502,7 @@ def main():
     success_count = 0
     fail_count = 0
 
+    jobs = []
     for zip_name, config in CASE_MAPPINGS.items():
         zip_path = DATA_DIR / zip_name
 
@@ -345,10 +510,23 @@ def main():
             print(f"\n⚠ Skipping {zip_name} - file not found")
             continue
 
-        if process_dicom_zip(zip_path, config):
-            success_count += 1
-        else:
-            fail_count += 1
+        jobs.append((zip_name, config))
+
+    # Cases are independent: run one per process, each encoding its slices
+    # inline, so wall time tracks the slowest case rather than the sum.
+    # spawn, as in write_pngs: a forked child of a process whose Numba
+    # thread pool has started can hang on exit
+    if jobs:
+        workers = min(len(jobs), os.cpu_count() or 1)
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for ok, log in executor.map(_process_case, jobs):
+                print(log, end="")
+                if ok:
+                    success_count += 1
+                else:
+                    fail_count += 1
 
     print("\n" + "=" * 60)
     print(f"COMPLETE: {success_count} succeeded, {fail_count} failed")
@@ -5,6 +5,7 @@ Generates PDF report and opens it
 
 Usage:
     python scripts/run_ovarian_case.py [--local] [--case CASE_ID]
+    python scripts/run_ovarian_case.py [--local] --cases CASE_A,CASE_B
 """
 
 import os
@@ -12,9 +13,15 @@ import sys
 import json
 import time
 import argparse
+import contextlib
+import io
+import itertools
+import multiprocessing
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Optional, Tuple
 
 # Add requests if not available
 try:
@@ -24,18 +31,73 @@ except ImportError:
     subprocess.check_call([sys.executable, "-m", "pip", "install", "requests", "-q"])
     import requests
 
+# Optional: orjson parses the many small stream events (and writes the
+# result) several times faster than the stdlib json module
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Configuration
 PRODUCTION_URL = "https://virtual-tumor-board-production.up.railway.app"
 LOCAL_URL = "http://localhost:3000"
 DEFAULT_CASE = "ovarian-brca1-hgsoc"
+# Report section rules
+_BAR = "=" * 80
+_RULE = "=" * 60
+
+# Read size for the event stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# One pooled session so the health check and the stream reuse the same
+# connection (and TLS handshake)
+SESSION = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
 
 
 def get_base_url(use_local: bool) -> str:
     return LOCAL_URL if use_local else PRODUCTION_URL
 
 
-def stream_deliberation(base_url: str, case_id: str) -> dict:
-    """Stream the deliberation and collect all responses"""
+def _sse_events(response, log=None):
+    """
+    Yield the JSON payload of each `data:` line in a server-sent event
+    stream, reading it in large chunks and splitting frames on blank lines.
+    Each parsed payload is also appended to `log` (a binary file) as NDJSON.
+    """
+    loads = orjson.loads if HAS_ORJSON else json.loads
+    buf = b""
+    # The trailing terminator flushes a last frame the server didn't close
+    chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+    for chunk in itertools.chain(chunks, [b"\n\n"]):
+        # A \r\n split across chunks leaves a lone \r, which splitlines()
+        # still treats as a line end
+        buf += chunk.replace(b"\r\n", b"\n")
+        *frames, buf = buf.split(b"\n\n")
+        for frame in frames:
+            for line in frame.splitlines():
+                if line.startswith(b"data: "):
+                    try:
+                        data = loads(line[6:])
+                    except json.JSONDecodeError:
+                        continue
+                    if log is not None:
+                        log.write(line[6:] + b"\n")
+                    yield data
+
+
+def stream_deliberation(
+    base_url: str, case_id: str, events_path: Optional[Path] = None
+) -> dict:
+    """
+    Stream the deliberation and collect all responses. If events_path is
+    given, every event is also written there as NDJSON as it arrives, so a
+    partial run is still on disk if the stream aborts.
+    """
     print(f"\n🏥 Starting Virtual Tumor Board Deliberation")
     print(f"   Case: {case_id}")
     print(f"   Server: {base_url}")
@@ -44,65 +106,64 @@ def stream_deliberation(base_url: str, case_id: str) -> dict:
     url = f"{base_url}/api/deliberate/stream?caseId={case_id}&refresh=true"
 
     agent_responses = {}
-    consensus = ""
+    # Chunks are collected in lists and joined once per response
+    consensus_parts = []
     current_agent = None
-    current_response = ""
+    current_parts = []
 
     try:
-        response = requests.get(url, stream=True, timeout=300)
+        response = SESSION.get(
+            url, stream=True, timeout=300, headers={"Accept": "text/event-stream"}
+        )
         response.raise_for_status()
 
-        for line in response.iter_lines():
-            if line:
-                line_str = line.decode("utf-8")
-                if line_str.startswith("data: "):
-                    try:
-                        data = json.loads(line_str[6:])
-                        event_type = data.get("type", "")
-
-                        if event_type == "case_info":
-                            print(f"📋 Case loaded: {data.get('caseId')}")
-                            print(f"   Cached: {data.get('isCached', False)}")
-
-                        elif event_type == "phase_change":
-                            phase = data.get("phase", "")
-                            print(f"\n📍 Phase: {phase}")
-
-                        elif event_type == "agent_start":
-                            agent_id = data.get("agentId", "")
-                            agent_name = data.get("name", agent_id)
-                            current_agent = agent_id
-                            current_response = ""
-                            print(
-                                f"\n👨‍⚕️ {agent_name} is thinking...", end="", flush=True
-                            )
-
-                        elif event_type == "agent_chunk":
-                            chunk = data.get("chunk", "")
-                            current_response += chunk
-                            # Print dots for progress
-                            print(".", end="", flush=True)
-
-                        elif event_type == "agent_complete":
-                            agent_id = data.get("agentId", current_agent)
-                            if agent_id and current_response:
-                                agent_responses[agent_id] = {
-                                    "response": current_response,
-                                    "citations": data.get("citations", []),
-                                    "toolsUsed": data.get("toolsUsed", []),
-                                }
-                            word_count = len(current_response.split())
-                            print(f" Done! ({word_count} words)")
-
-                        elif event_type == "consensus_chunk":
-                            consensus += data.get("chunk", "")
-
-                        elif event_type == "done":
-                            print("\n✅ Deliberation complete!")
-                            break
-
-                    except json.JSONDecodeError:
-                        pass
+        log_file = open(events_path, "wb") if events_path else contextlib.nullcontext()
+        with log_file as log:
+            for data in _sse_events(response, log):
+                event_type = data.get("type", "")
+
+                if event_type == "case_info":
+                    print(f"📋 Case loaded: {data.get('caseId')}")
+                    print(f"   Cached: {data.get('isCached', False)}")
+
+                elif event_type == "phase_change":
+                    phase = data.get("phase", "")
+                    print(f"\n📍 Phase: {phase}")
+
+                elif event_type == "agent_start":
+                    agent_id = data.get("agentId", "")
+                    agent_name = data.get("name", agent_id)
+                    current_agent = agent_id
+                    current_parts.clear()
+                    print(f"\n👨‍⚕️ {agent_name} is thinking...", end="", flush=True)
+
+                elif event_type == "agent_chunk":
+                    current_parts.append(data.get("chunk", ""))
+                    # Print dots for progress
+                    print(".", end="", flush=True)
+
+                elif event_type == "agent_complete":
+                    agent_id = data.get("agentId", current_agent)
+                    current_response = "".join(current_parts)
+                    current_parts.clear()
+                    # Counted once here; the summary and report reuse it
+                    word_count = len(current_response.split())
+                    if agent_id and current_response:
+                        agent_responses[agent_id] = {
+                            "response": current_response,
+                            "citations": data.get("citations", []),
+                            "toolsUsed": data.get("toolsUsed", []),
+                            "wordCount": word_count,
+                            "charCount": len(current_response),
+                        }
+                    print(f" Done! ({word_count} words)")
+
+                elif event_type == "consensus_chunk":
+                    consensus_parts.append(data.get("chunk", ""))
+
+                elif event_type == "done":
+                    print("\n✅ Deliberation complete!")
+                    break
 
     except requests.exceptions.Timeout:
         print("\n⚠️ Request timed out - deliberation may still be processing")
@@ -110,9 +171,11 @@ def stream_deliberation(base_url: str, case_id: str) -> dict:
         print(f"\n❌ Error: {e}")
         return {}
 
+    consensus = "".join(consensus_parts)
     return {
         "agentResponses": agent_responses,
         "consensus": consensus,
+        "consensusWordCount": len(consensus.split()),
         "caseId": case_id,
     }
 
@@ -134,8 +197,11 @@ def save_deliberation_json(case_id: str, data: dict, output_dir: Path) -> Path:
     filename = f"deliberation_{case_id}_{timestamp}.json"
     filepath = output_dir / filename
 
-    with open(filepath, "w") as f:
-        json.dump(data, f, indent=2)
+    if HAS_ORJSON:
+        filepath.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filepath, "w") as f:
+            json.dump(data, f, indent=2)
 
     print(f"💾 Saved deliberation data: {filepath}")
     return filepath
@@ -157,59 +223,142 @@ def create_text_report(case_id: str, data: dict, output_dir: Path) -> Path:
         "geneticist": "Dr. Anuvamsha - Genetics",
     }
 
-    with open(filepath, "w") as f:
-        f.write("=" * 80 + "\n")
-        f.write("VIRTUAL TUMOR BOARD REPORT\n")
-        f.write(f"Case: {case_id}\n")
-        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 80 + "\n\n")
-
+    # Build the whole report in memory and write it once
+    out = [
+        _BAR + "\n",
+        "VIRTUAL TUMOR BOARD REPORT\n",
+        f"Case: {case_id}\n",
+        f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        _BAR + "\n\n",
         # Specialist opinions
-        f.write("SPECIALIST OPINIONS\n")
-        f.write("-" * 80 + "\n\n")
-
-        for agent_id, agent_data in data.get("agentResponses", {}).items():
-            agent_name = agent_names.get(agent_id, agent_id)
-            response = agent_data.get("response", "No response")
+        "SPECIALIST OPINIONS\n",
+        "-" * 80 + "\n\n",
+    ]
+
+    for agent_id, agent_data in data.get("agentResponses", {}).items():
+        agent_name = agent_names.get(agent_id, agent_id)
+        response = agent_data.get("response", "No response")
+        if "wordCount" in agent_data:
+            word_count = agent_data["wordCount"]
+        else:
             word_count = len(response.split())
 
-            f.write(f"\n{'=' * 60}\n")
-            f.write(f"{agent_name}\n")
-            f.write(f"({'=' * 60}\n")
-            f.write(f"[{word_count} words]\n\n")
-            f.write(response)
-            f.write("\n\n")
-
-            citations = agent_data.get("citations", [])
-            if citations:
-                f.write(f"Citations: {', '.join(citations)}\n")
-
-        # Consensus
-        consensus = data.get("consensus", "")
-        if consensus:
-            f.write("\n" + "=" * 80 + "\n")
-            f.write("TUMOR BOARD CONSENSUS\n")
-            f.write("=" * 80 + "\n\n")
-            f.write(consensus)
-
-        f.write("\n\n" + "=" * 80 + "\n")
-        f.write(
-            "DISCLAIMER: This AI-generated report is for informational purposes only.\n"
-        )
-        f.write(
-            "Always consult with qualified healthcare professionals for medical decisions.\n"
-        )
-        f.write("=" * 80 + "\n")
+        out += [
+            f"\n{_RULE}\n",
+            f"{agent_name}\n",
+            f"({_RULE}\n",
+            f"[{word_count} words]\n\n",
+            response,
+            "\n\n",
+        ]
+
+        citations = agent_data.get("citations", [])
+        if citations:
+            out.append(f"Citations: {', '.join(citations)}\n")
+
+    # Consensus
+    consensus = data.get("consensus", "")
+    if consensus:
+        out += ["\n" + _BAR + "\n", "TUMOR BOARD CONSENSUS\n", _BAR + "\n\n", consensus]
+
+    out += [
+        "\n\n" + _BAR + "\n",
+        "DISCLAIMER: This AI-generated report is for informational purposes only.\n",
+        "Always consult with qualified healthcare professionals for medical decisions.\n",
+        _BAR + "\n",
+    ]
+    filepath.write_text("".join(out), encoding="utf-8")
 
     print(f"📝 Saved text report: {filepath}")
     return filepath
 
 
+def run_case(base_url: str, case_id: str, output_dir: Path) -> Optional[Path]:
+    """
+    Run one case's deliberation, save its outputs and print a summary.
+    Returns the text report path, or None if no deliberation data arrived.
+    """
+    # Run deliberation
+    start_time = time.time()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    events_path = output_dir / f"deliberation_{case_id}_{timestamp}.ndjson"
+    deliberation_data = stream_deliberation(base_url, case_id, events_path)
+    elapsed_time = time.time() - start_time
+
+    if not deliberation_data.get("agentResponses"):
+        print("\n❌ No deliberation data received. Please check the server logs.")
+        return None
+
+    print(f"\n⏱️ Total deliberation time: {elapsed_time:.1f} seconds")
+
+    # Count total words
+    agent_responses = deliberation_data.get("agentResponses", {})
+    consensus_words = deliberation_data["consensusWordCount"]
+    total_words = sum(a["wordCount"] for a in agent_responses.values())
+    total_words += consensus_words
+    print(f"📊 Total words generated: {total_words:,}")
+
+    # Save outputs
+    json_path = save_deliberation_json(case_id, deliberation_data, output_dir)
+    txt_path = create_text_report(case_id, deliberation_data, output_dir)
+
+    # Print summary
+    print("\n" + "=" * 60)
+    print("📋 SPECIALIST RESPONSE SUMMARY")
+    print("=" * 60)
+
+    for agent_id, agent_data in agent_responses.items():
+        word_count = agent_data["wordCount"]
+        char_count = agent_data["charCount"]
+        status = "✅" if word_count >= 400 else "⚠️" if word_count >= 200 else "❌"
+        print(f"  {status} {agent_id}: {word_count} words ({char_count:,} chars)")
+
+    print(
+        f"  {'✅' if consensus_words >= 500 else '⚠️'} consensus: {consensus_words} words"
+    )
+
+    print("\n" + "=" * 60)
+    print("📁 OUTPUT FILES")
+    print("=" * 60)
+    print(f"  JSON: {json_path}")
+    print(f"  Events: {events_path}")
+    print(f"  Text: {txt_path}")
+
+    return txt_path
+
+
+def _run_case_logged(job: Tuple[str, str, Path]) -> Tuple[Optional[Path], str]:
+    """
+    run_case() in a worker process; returns (report path, captured log) so
+    the parent can print each case's output as one block.
+    """
+    base_url, case_id, output_dir = job
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        txt_path = run_case(base_url, case_id, output_dir)
+    return txt_path, log.getvalue()
+
+
+def _open_file(target: str):
+    """
+    Hand a path or URL to the desktop's default handler without waiting for
+    the launcher to return.
+    """
+    if sys.platform == "win32":
+        os.startfile(target)
+        return
+    opener = "open" if sys.platform == "darwin" else "xdg-open"
+    subprocess.Popen(
+        [opener, target],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
 def open_in_browser(url: str):
     """Open URL in default browser"""
-    import webbrowser
-
-    webbrowser.open(url)
+    _open_file(url)
 
 
 def main():
@@ -220,6 +369,10 @@ def main():
     parser.add_argument(
         "--case", default=DEFAULT_CASE, help=f"Case ID to run (default: {DEFAULT_CASE})"
     )
+    parser.add_argument(
+        "--cases",
+        help="Comma-separated case IDs to run concurrently (overrides --case)",
+    )
     parser.add_argument(
         "--output", default="./output", help="Output directory for reports"
     )
@@ -239,7 +392,7 @@ def main():
     # Check server availability
     print(f"\n🔍 Checking server availability...")
     try:
-        health_check = requests.get(f"{base_url}/api/analytics/status", timeout=10)
+        health_check = SESSION.get(f"{base_url}/api/analytics/status", timeout=10)
         health_check.raise_for_status()
         print(f"   ✅ Server is online")
     except:
@@ -247,60 +400,38 @@ def main():
         if not args.local:
             print("   Tip: Try --local if running locally")
 
-    # Run deliberation
-    start_time = time.time()
-    deliberation_data = stream_deliberation(base_url, args.case)
-    elapsed_time = time.time() - start_time
-
-    if not deliberation_data.get("agentResponses"):
-        print("\n❌ No deliberation data received. Please check the server logs.")
-        sys.exit(1)
-
-    print(f"\n⏱️ Total deliberation time: {elapsed_time:.1f} seconds")
-
-    # Count total words
-    total_words = sum(
-        len(a.get("response", "").split())
-        for a in deliberation_data.get("agentResponses", {}).values()
-    )
-    total_words += len(deliberation_data.get("consensus", "").split())
-    print(f"📊 Total words generated: {total_words:,}")
-
-    # Save outputs
-    json_path = save_deliberation_json(args.case, deliberation_data, output_dir)
-    txt_path = create_text_report(args.case, deliberation_data, output_dir)
-
-    # Print summary
-    print("\n" + "=" * 60)
-    print("📋 SPECIALIST RESPONSE SUMMARY")
-    print("=" * 60)
-
-    for agent_id, agent_data in deliberation_data.get("agentResponses", {}).items():
-        response = agent_data.get("response", "")
-        word_count = len(response.split())
-        char_count = len(response)
-        status = "✅" if word_count >= 400 else "⚠️" if word_count >= 200 else "❌"
-        print(f"  {status} {agent_id}: {word_count} words ({char_count:,} chars)")
-
-    consensus_words = len(deliberation_data.get("consensus", "").split())
-    print(
-        f"  {'✅' if consensus_words >= 500 else '⚠️'} consensus: {consensus_words} words"
-    )
+    cases = args.cases.split(",") if args.cases else [args.case]
 
-    print("\n" + "=" * 60)
-    print("📁 OUTPUT FILES")
-    print("=" * 60)
-    print(f"  JSON: {json_path}")
-    print(f"  Text: {txt_path}")
+    if len(cases) == 1:
+        txt_path = run_case(base_url, cases[0], output_dir)
+        if txt_path is None:
+            sys.exit(1)
+    else:
+        # Deliberations are independent and almost entirely network wait,
+        # so run one per process; spawn, since the parent's session may
+        # already hold a pooled connection a fork would share
+        print(f"\n🚀 Running {len(cases)} cases concurrently: {', '.join(cases)}")
+        jobs = [(base_url, case_id, output_dir) for case_id in cases]
+        with ProcessPoolExecutor(
+            max_workers=len(jobs), mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = list(executor.map(_run_case_logged, jobs))
+
+        for case_id, (txt_path, log) in zip(cases, results):
+            print(f"\n{'#' * 60}\n# {case_id}\n{'#' * 60}")
+            print(log, end="")
+
+        failed = [case_id for case_id, (path, _) in zip(cases, results) if path is None]
+        if failed:
+            print(f"\n❌ No deliberation data for: {', '.join(failed)}")
+            sys.exit(1)
+        # Opening one report per case would flood the desktop
+        txt_path = None
 
     # Open text report
-    print(f"\n📖 Opening text report...")
-    if sys.platform == "darwin":
-        subprocess.run(["open", str(txt_path)])
-    elif sys.platform == "win32":
-        os.startfile(str(txt_path))
-    else:
-        subprocess.run(["xdg-open", str(txt_path)])
+    if txt_path is not None:
+        print(f"\n📖 Opening text report...")
+        _open_file(str(txt_path))
 
     # Optionally open browser
     if args.open_browser:
@@ -312,7 +443,7 @@ def main():
     print("💡 TO GENERATE PDF:")
     print("=" * 60)
     print(f"  1. Open: {base_url}/demo")
-    print(f"  2. Select case: {args.case}")
+    print(f"  2. Select case: {', '.join(cases)}")
     print(f"  3. Click 'Start AI Tumor Board Deliberation'")
     print(f"  4. After completion, click 'Download PDF'")
     print("=" * 60 + "\n")
@@ -7,6 +7,7 @@ Usage:
     python scripts/test_sso_rag.py
 """
 
+import asyncio
 import os
 from pathlib import Path
 from google import genai
@@ -53,15 +54,16 @@ TEST_QUERIES = [
 ]
 
 
-def test_query(query: str, expected_keywords: list) -> dict:
-    """Test a single query against the SSO File Search store"""
-    print(f"\n{'=' * 60}")
-    print(f"Query: {query[:80]}...")
-    print("=" * 60)
+async def test_query(query: str, expected_keywords: list) -> tuple:
+    """
+    Test a single query against the SSO File Search store.
+    Returns (result, output lines) so concurrent queries don't interleave.
+    """
+    lines = [f"\n{'=' * 60}", f"Query: {query[:80]}...", "=" * 60]
 
     try:
         # Use Gemini with File Search grounding
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model="gemini-3-flash-preview",  # File Search requires gemini-3-flash-preview
             contents=query,
             config=types.GenerateContentConfig(
@@ -77,22 +79,23 @@ def test_query(query: str, expected_keywords: list) -> dict:
         )
 
         answer = response.text or ""
-        print(f"\nResponse ({len(answer)} chars):")
-        print("-" * 40)
-        print(answer[:1000] + ("..." if len(answer) > 1000 else ""))
+        lines.append(f"\nResponse ({len(answer)} chars):")
+        lines.append("-" * 40)
+        lines.append(answer[:1000] + ("..." if len(answer) > 1000 else ""))
 
-        # Check for expected keywords
+        # Check for expected keywords (lowercase the answer once, not per keyword)
+        answer_lc = answer.lower()
         found = []
         missing = []
         for kw in expected_keywords:
-            if kw.lower() in answer.lower():
+            if kw.lower() in answer_lc:
                 found.append(kw)
             else:
                 missing.append(kw)
 
-        print(f"\nKeywords found: {found}")
+        lines.append(f"\nKeywords found: {found}")
         if missing:
-            print(f"Keywords missing: {missing}")
+            lines.append(f"Keywords missing: {missing}")
 
         # Check for grounding metadata
         if hasattr(response, "candidates") and response.candidates:
@@ -103,18 +106,33 @@ def test_query(query: str, expected_keywords: list) -> dict:
             ):
                 gm = candidate.grounding_metadata
                 chunks = getattr(gm, "grounding_chunks", None)
-                print(f"Grounding sources: {len(chunks) if chunks else 'N/A'}")
+                lines.append(f"Grounding sources: {len(chunks) if chunks else 'N/A'}")
 
         return {
             "success": True,
             "found_keywords": found,
             "missing_keywords": missing,
             "response_length": len(answer),
-        }
+        }, lines
 
     except Exception as e:
-        print(f"\nERROR: {e}")
-        return {"success": False, "error": str(e)}
+        lines.append(f"\nERROR: {e}")
+        return {"success": False, "error": str(e)}, lines
+
+
+async def run_queries() -> list:
+    """
+    Run all test queries concurrently (each is a few seconds of network
+    wait) and print their output blocks in query order.
+    """
+    outcomes = await asyncio.gather(
+        *(test_query(t["query"], t["expected_keywords"]) for t in TEST_QUERIES)
+    )
+    results = []
+    for result, lines in outcomes:
+        print("\n".join(lines))
+        results.append(result)
+    return results
 
 
 def main():
@@ -123,10 +141,7 @@ def main():
     print(f"Store: {SSO_STORE_ID}")
     print("=" * 60)
 
-    results = []
-    for test in TEST_QUERIES:
-        result = test_query(test["query"], test["expected_keywords"])
-        results.append(result)
+    results = asyncio.run(run_queries())
 
     # Summary
     print("\n" + "=" * 60)
@@ -6,17 +6,20 @@ In demo mode (default), generates synthetic segmentation masks.
 With MedSAM3 weights, provides real AI segmentation.
 """
 
+import asyncio
 import os
 import io
 import base64
 import json
-from typing import List, Optional, Tuple
+from typing import List, Literal, Optional, Tuple
 from contextlib import asynccontextmanager
+from functools import lru_cache
 
 import numpy as np
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
 
 # Try to import predictor (optional dependency)
 try:
@@ -28,9 +31,30 @@ except ImportError:
     print("MedSAM3Predictor not available - running in demo mode")
 
 
+# Optional: orjson serializes the RLE/contour lists much faster than json
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+
+    DefaultResponse = ORJSONResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
+# Optional: OpenCV for mask contours
+try:
+    import cv2
+
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+
 # Global predictor instance
 predictor = None
 
+# Concurrent model inferences allowed; more would contend for the GPU
+INFERENCE_SEMAPHORE = asyncio.Semaphore(int(os.getenv("SEG_CONCURRENCY", "2")))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -42,6 +66,16 @@ async def lifespan(app: FastAPI):
     if HAS_PREDICTOR and checkpoint_path and os.path.exists(checkpoint_path):
         print(f"Loading model from {checkpoint_path}...")
         predictor = MedSAM3Predictor(checkpoint_path)
+
+        # One dummy forward pass so the first real request doesn't pay for
+        # CUDA/cuDNN initialization
+        try:
+            predictor.segment_slice(
+                np.zeros((256, 256), dtype=np.float32),
+                {"points": [[128, 128]], "labels": [1]},
+            )
+        except Exception as e:
+            print(f"Warm-up inference failed: {e}")
     else:
         print("Running in demo mode (no model loaded)")
         predictor = None
@@ -57,6 +91,7 @@ app = FastAPI(
     description="AI-powered tumor segmentation for Virtual Tumor Board",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=DefaultResponse,
 )
 
 # Configure CORS
@@ -66,6 +101,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Mask geometry for ?encoding=packbits responses
+    expose_headers=["X-Mask-Shape", "X-Confidence"],
 )
 
 
@@ -94,6 +131,9 @@ class SegmentationRequest(BaseModel):
 
     slice_data: str  # Base64 encoded numpy array or image
     slice_shape: List[int]  # [height, width]
+    # Pixel type of slice_data: int16 for raw CT, uint8 for windowed display
+    # images (a quarter of the float32 payload)
+    dtype: Literal["float32", "int16", "uint16", "uint8"] = "float32"
     points: Optional[List[PointPrompt]] = None
     boxes: Optional[List[BoxPrompt]] = None
     window_center: Optional[float] = None
@@ -103,7 +143,9 @@ class SegmentationRequest(BaseModel):
 class SegmentationResponse(BaseModel):
     """Response containing segmentation mask."""
 
-    mask_rle: List[List[int]]  # Run-length encoded mask
+    # Run lengths in row-major order, alternating 0/1 runs starting with 0
+    # (COCO style; the first count is 0 when the mask starts with a 1)
+    mask_rle: List[int]
     mask_shape: List[int]
     confidence: float
     contours: Optional[List[List[List[float]]]] = None  # Optional polygon contours
@@ -113,10 +155,14 @@ class PropagationRequest(BaseModel):
     """Request for propagating segmentation through slices."""
 
     case_id: str
-    start_slice: int
+    start_slice: int = Field(ge=0)
     direction: str = "both"  # "forward", "backward", "both"
     initial_points: List[PointPrompt]
-    max_slices: Optional[int] = None
+    # Negative values would leave an empty slice range (rejected with 422)
+    max_slices: Optional[int] = Field(default=None, ge=0)
+    # Volume geometry; in demo mode these are enough to propagate
+    slice_shape: Optional[List[int]] = None  # [height, width]
+    num_slices: Optional[int] = Field(default=None, ge=1)
 
 
 class HealthResponse(BaseModel):
@@ -130,18 +176,21 @@ class HealthResponse(BaseModel):
 # --- Helper Functions ---
 
 
-def decode_slice(data: str, shape: List[int]) -> np.ndarray:
+def decode_slice(data: str, shape: List[int], dtype: str = "float32") -> np.ndarray:
     """Decode base64 slice data to numpy array."""
     try:
         decoded = base64.b64decode(data)
-        arr = np.frombuffer(decoded, dtype=np.float32)
+        arr = np.frombuffer(decoded, dtype=np.dtype(dtype))
         return arr.reshape(shape)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to decode slice: {e}")
 
 
-def mask_to_rle(mask: np.ndarray) -> List[List[int]]:
-    """Convert binary mask to run-length encoding."""
+def mask_to_rle(mask: np.ndarray) -> List[int]:
+    """
+    Convert binary mask to COCO-style run lengths: counts of alternating
+    0/1 runs over the flattened mask, starting with a (possibly empty) 0 run.
+    """
     flat = mask.flatten().astype(np.uint8)
 
     if len(flat) == 0:
@@ -151,17 +200,25 @@ def mask_to_rle(mask: np.ndarray) -> List[List[int]]:
     changes = np.diff(flat)
     change_indices = np.where(changes != 0)[0] + 1
 
-    # Build runs
-    starts = np.concatenate([[0], change_indices])
-    ends = np.concatenate([change_indices, [len(flat)]])
+    # Run boundaries; a leading 0 keeps the first run a 0 run
+    head = [0, 0] if flat[0] else [0]
+    bounds = np.concatenate([head, change_indices, [len(flat)]])
+
+    return np.diff(bounds).tolist()
 
-    rle = []
-    for start, end in zip(starts, ends):
-        value = int(flat[start])
-        length = int(end - start)
-        rle.append([value, length])
 
-    return rle
+@lru_cache(maxsize=8)
+def _grids(H: int, W: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cached float32 (H, 1) / (1, W) coordinate grids for the demo masks;
+    read-only since every caller with the same shape shares them.
+    """
+    y_grid, x_grid = np.ogrid[:H, :W]
+    y_grid = y_grid.astype(np.float32)
+    x_grid = x_grid.astype(np.float32)
+    y_grid.flags.writeable = False
+    x_grid.flags.writeable = False
+    return y_grid, x_grid
 
 
 def generate_demo_mask(
@@ -197,42 +254,82 @@ def generate_demo_mask(
     rx = min(W, H) // 6  # radius x
     ry = min(W, H) // 7  # radius y
 
-    y_grid, x_grid = np.ogrid[:H, :W]
+    y_grid, x_grid = _grids(H, W)
     dist = ((x_grid - cx) / rx) ** 2 + ((y_grid - cy) / ry) ** 2
 
     # Create smooth ellipse
     mask = dist <= 1.0
 
-    # Add some irregularity using noise
-    np.random.seed(int(cx * 100 + cy * 10))
-    noise = np.random.random((H, W)) * 0.3
-    boundary = (dist > 0.7) & (dist < 1.3)
-    mask[boundary] = (dist[boundary] + noise[boundary]) <= 1.1
+    # Add some irregularity using noise, drawn only for the boundary band;
+    # a local Generator keeps concurrent requests from sharing global state
+    rng = np.random.default_rng(int(cx * 100 + cy * 10))
+    boundary = np.nonzero((dist > 0.7) & (dist < 1.3))
+    noise = rng.random(boundary[0].size) * 0.3
+    mask[boundary] = (dist[boundary] + noise) <= 1.1
 
     return mask
 
 
+def generate_demo_masks(
+    shape: Tuple[int, int], centers: np.ndarray, scales: np.ndarray, seed: int = 0
+) -> np.ndarray:
+    """
+    Batched generate_demo_mask: an (N, H, W) stack of noisy ellipses, one per
+    (cx, cy) row of centers with radii multiplied by scales, computed in a
+    single broadcast pass rather than N separate calls.
+    """
+    H, W = shape
+    cx = centers[:, 0, None, None].astype(np.float32)
+    cy = centers[:, 1, None, None].astype(np.float32)
+    rx = (min(W, H) // 6) * scales[:, None, None].astype(np.float32)
+    ry = (min(W, H) // 7) * scales[:, None, None].astype(np.float32)
+
+    y_grid, x_grid = _grids(H, W)
+    y, x = y_grid[None], x_grid[None]
+    dist = ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2
+
+    mask = dist <= 1.0
+
+    # Same boundary-band irregularity as the single-slice mask
+    rng = np.random.default_rng(seed)
+    boundary = np.nonzero((dist > 0.7) & (dist < 1.3))
+    noise = rng.random(boundary[0].size, dtype=np.float32) * 0.3
+    mask[boundary] = (dist[boundary] + noise) <= 1.1
+
+    return mask
+
+
+# Contours enclosing fewer pixels than this are dropped as speckle
+MIN_CONTOUR_AREA = 4.0
+
+
 def find_contours(mask: np.ndarray) -> List[List[List[float]]]:
     """Find contours in binary mask."""
-    try:
-        import cv2
+    if not HAS_CV2:
+        return []
 
-        mask_uint8 = mask.astype(np.uint8) * 255
-        contours, _ = cv2.findContours(
-            mask_uint8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-        )
+    mask_uint8 = mask.astype(np.uint8) * 255
+    contours, _ = cv2.findContours(
+        mask_uint8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
 
-        result = []
-        for contour in contours:
-            points = contour.squeeze().astype(float).tolist()
-            if isinstance(points[0], list):  # Multiple points
-                result.append(points)
-            else:  # Single point - wrap it
-                result.append([points])
+    result = []
+    for contour in contours:
+        # Drop speckle before spending anything on it
+        if cv2.contourArea(contour) < MIN_CONTOUR_AREA:
+            continue
 
-        return result
-    except ImportError:
-        return []
+        # Douglas-Peucker: within ~1 px (or 0.2% of the perimeter) of the
+        # pixel outline with a fraction of its vertices
+        epsilon = max(1.0, 0.002 * cv2.arcLength(contour, True))
+        contour = cv2.approxPolyDP(contour, epsilon, True)
+
+        # (N, 1, 2) int32 point arrays; fewer than 3 points is not a polygon.
+        # Pixel coordinates are exact in float32.
+        if len(contour) >= 3:
+            result.append(contour.reshape(-1, 2).astype(np.float32).tolist())
+
+    return result
 
 
 # --- API Endpoints ---
@@ -255,22 +352,14 @@ async def health():
     return await health_check()
 
 
-@app.post("/segment", response_model=SegmentationResponse)
-async def segment_slice(request: SegmentationRequest):
-    """
-    Segment a single 2D slice using point or box prompts.
-
-    Returns run-length encoded mask for efficient transmission.
-    """
-    if not request.points and not request.boxes:
-        raise HTTPException(status_code=400, detail="Must provide points or boxes")
-
+def _segment_sync(request: SegmentationRequest, encoding: str) -> Response:
+    """Decode, segment and encode one slice (CPU/GPU-bound; runs in a thread)."""
     shape = tuple(request.slice_shape)
 
     if predictor is not None and getattr(predictor, "model_loaded", False):
         # Real segmentation with MedSAM3
         try:
-            slice_data = decode_slice(request.slice_data, shape)
+            slice_data = decode_slice(request.slice_data, shape, request.dtype)
 
             # Build prompt dict
             prompt = {}
@@ -291,35 +380,129 @@ async def segment_slice(request: SegmentationRequest):
         mask = generate_demo_mask(shape, request.points, request.boxes)
         confidence = 0.75  # Demo confidence
 
+    if encoding == "packbits":
+        # 1 bit per pixel, row-major, MSB first, zero-padded to a whole byte
+        return Response(
+            content=np.packbits(mask).tobytes(),
+            media_type="application/octet-stream",
+            headers={
+                "X-Mask-Shape": f"{mask.shape[0]},{mask.shape[1]}",
+                "X-Confidence": str(confidence),
+            },
+        )
+
     # Convert to RLE
     rle = mask_to_rle(mask)
 
     # Find contours
     contours = find_contours(mask)
 
-    return SegmentationResponse(
-        mask_rle=rle,
-        mask_shape=list(mask.shape),
-        confidence=confidence,
-        contours=contours,
+    # Returning a Response skips re-validating the (potentially huge) RLE
+    # and contour lists against SegmentationResponse, which stays the
+    # documented schema
+    return DefaultResponse(
+        {
+            "mask_rle": rle,
+            "mask_shape": list(mask.shape),
+            "confidence": confidence,
+            "contours": contours,
+        }
     )
 
 
+@app.post("/segment", response_model=SegmentationResponse)
+async def segment_slice(
+    request: SegmentationRequest, encoding: Literal["rle", "packbits"] = "rle"
+):
+    """
+    Segment a single 2D slice using point or box prompts.
+
+    Returns run-length encoded mask for efficient transmission, or with
+    ?encoding=packbits the raw np.packbits(mask) bytes (shape and
+    confidence in the X-Mask-Shape / X-Confidence headers, no contours).
+    """
+    if not request.points and not request.boxes:
+        raise HTTPException(status_code=400, detail="Must provide points or boxes")
+
+    # NumPy, OpenCV and PyTorch release the GIL, so running the work in a
+    # thread keeps the event loop free to serve other requests meanwhile
+    if predictor is not None and getattr(predictor, "model_loaded", False):
+        async with INFERENCE_SEMAPHORE:
+            return await asyncio.to_thread(_segment_sync, request, encoding)
+    return await asyncio.to_thread(_segment_sync, request, encoding)
+
+
+# Slices per broadcast batch, bounding the (N, H, W) float32 distance array
+PROPAGATION_BATCH = 16
+
+
+def _propagate_demo(request: PropagationRequest) -> dict:
+    """
+    Demo propagation: the prompt's ellipse on every slice in range, tapering
+    away from start_slice like a roughly spherical lesion.
+    """
+    H, W = request.slice_shape
+    fg_points = [p for p in request.initial_points if p.label == 1]
+    cx, cy = (fg_points[0].x, fg_points[0].y) if fg_points else (W / 2, H / 2)
+
+    reach = request.max_slices if request.max_slices is not None else request.num_slices
+    lo = request.start_slice
+    hi = request.start_slice
+    if request.direction in ("backward", "both"):
+        lo = max(0, request.start_slice - reach)
+    if request.direction in ("forward", "both"):
+        hi = min(request.num_slices - 1, request.start_slice + reach)
+    indices = np.arange(lo, hi + 1)
+
+    offsets = np.abs(indices - request.start_slice)
+    scales = np.sqrt(1 - (offsets / (offsets.max() + 1)) ** 2)
+    centers = np.tile([cx, cy], (len(indices), 1))
+
+    slices = []
+    for i in range(0, len(indices), PROPAGATION_BATCH):
+        batch = slice(i, i + PROPAGATION_BATCH)
+        masks = generate_demo_masks(
+            (H, W), centers[batch], scales[batch], seed=int(cx * 100 + cy * 10) + i
+        )
+        slices.extend(
+            {"slice_index": int(k), "mask_rle": mask_to_rle(m)}
+            for k, m in zip(indices[batch], masks)
+        )
+
+    return {
+        "status": "ok",
+        "mode": "demo",
+        "case_id": request.case_id,
+        "mask_shape": [H, W],
+        "slices": slices,
+    }
+
+
 @app.post("/propagate")
 async def propagate_segmentation(request: PropagationRequest):
     """
     Propagate segmentation through volume slices.
 
-    This is a placeholder - actual implementation would need
-    access to the volume data, likely via a file reference or streaming.
+    In demo mode, slice_shape + num_slices are enough to generate masks for
+    the whole range. Real propagation would need access to the volume data,
+    likely via a file reference or streaming.
     """
-    return {
-        "status": "not_implemented",
-        "message": "Volume propagation requires access to the full volume. "
-        "Use the /segment endpoint for individual slices.",
-        "hint": "For 3D propagation, the frontend should iterate through slices "
-        "using the previous mask centroid as the next prompt.",
-    }
+    model_loaded = predictor is not None and getattr(predictor, "model_loaded", False)
+    if model_loaded or request.slice_shape is None or request.num_slices is None:
+        return {
+            "status": "not_implemented",
+            "message": "Volume propagation requires access to the full volume. "
+            "Use the /segment endpoint for individual slices.",
+            "hint": "For 3D propagation, the frontend should iterate through slices "
+            "using the previous mask centroid as the next prompt.",
+        }
+
+    if request.direction not in ("forward", "backward", "both"):
+        raise HTTPException(status_code=400, detail="Invalid direction")
+    if not 0 <= request.start_slice < request.num_slices:
+        raise HTTPException(status_code=400, detail="start_slice out of range")
+
+    return await asyncio.to_thread(_propagate_demo, request)
 
 
 @app.get("/model-info")
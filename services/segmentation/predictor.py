@@ -4,27 +4,137 @@ Wrapper for MedSAM3 inference with optional LoRA weights.
 Falls back to demo mode if SAM3/PyTorch not available.
 """
 
-import numpy as np
+import contextlib
+import importlib.util
+import inspect
+import os
+import pickle
+import threading
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
-# Try to import PyTorch and OpenCV
-try:
-    import torch
+import numpy as np
 
-    HAS_TORCH = True
-except ImportError:
-    HAS_TORCH = False
+# PyTorch and OpenCV are only looked up here; they are imported on first
+# use (_load_torch / _load_cv2) so demo-mode workers never pay for them
+HAS_TORCH = importlib.util.find_spec("torch") is not None
+if not HAS_TORCH:
     print("PyTorch not available - predictor will run in demo mode")
 
-try:
-    import cv2
-
-    HAS_CV2 = True
-except ImportError:
-    HAS_CV2 = False
+HAS_CV2 = importlib.util.find_spec("cv2") is not None
+if not HAS_CV2:
     print("OpenCV not available - some features limited")
 
+torch = None
+F = None
+cv2 = None
+
+
+def _load_torch() -> bool:
+    """Import PyTorch into this module's torch/F on first call."""
+    global torch, F, HAS_TORCH
+    if torch is None and HAS_TORCH:
+        try:
+            import torch as _torch
+            import torch.nn.functional as _F
+        except ImportError as e:
+            print(f"PyTorch import failed ({e}) - predictor will run in demo mode")
+            HAS_TORCH = False
+            return False
+        torch, F = _torch, _F
+    return HAS_TORCH
+
+
+def _load_cv2() -> bool:
+    """Import OpenCV into this module's cv2 on first call."""
+    global cv2, HAS_CV2
+    if cv2 is None and HAS_CV2:
+        try:
+            import cv2 as _cv2
+        except ImportError as e:
+            print(f"OpenCV import failed ({e}) - some features limited")
+            HAS_CV2 = False
+            return False
+        cv2 = _cv2
+    return HAS_CV2
+
+
+# Numba is optional - fall back to plain NumPy for the demo mask if missing
+# (also imported, and the kernel compiled, on first use)
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+# Persistent TorchInductor cache so compiled kernels survive restarts
+INDUCTOR_CACHE_DIR = Path.home() / ".cache" / "medsam3" / "inductor"
+
+# Prompt capacity of a captured CUDA graph; points are padded up to this
+# (label -1), larger prompts run eagerly
+MAX_GRAPH_POINTS = 8
+MAX_GRAPH_BOXES = 4
+
+# Slices per segment_slices forward pass
+MAX_BATCH_SLICES = 8
+
+# On CPU, Inductor's compile time outweighs its gains for large models;
+# only models up to this size get an aot_eager torch.compile
+CPU_COMPILE_MAX_PARAMS = 50_000_000
+
+
+@lru_cache(maxsize=8)
+def _grids(H: int, W: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cached float32 (H, 1) / (1, W) coordinate grids for the demo masks;
+    read-only since every slice of the same shape shares them.
+    """
+    y_grid, x_grid = np.ogrid[:H, :W]
+    y_grid = y_grid.astype(np.float32)
+    x_grid = x_grid.astype(np.float32)
+    y_grid.flags.writeable = False
+    x_grid.flags.writeable = False
+    return y_grid, x_grid
+
+
+def _ellipse_mask_py(out, cx, cy, rx, ry, x0, x1, y0, y1, seed):
+    """
+    Fill out[y0:y1, x0:x1] with the jittered ellipse in a single pass:
+    distance, noise and threshold per pixel, no temporaries. The noise
+    is a splitmix64 hash of (seed, pixel), so it needs no RNG state.
+    """
+    W = out.shape[1]
+    for y in range(y0, y1):
+        dy = (np.float32(y) - cy) / ry
+        dy2 = dy * dy
+        for x in range(x0, x1):
+            dx = (np.float32(x) - cx) / rx
+            d = dx * dx + dy2
+            if d <= np.float32(0.75):
+                out[y, x] = True
+            elif d < np.float32(1.25):
+                z = seed + np.uint64(y * W + x) * np.uint64(0x9E3779B97F4A7C15)
+                z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+                z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+                z = z ^ (z >> np.uint64(31))
+                # Top 24 bits -> uniform [0, 1) float32
+                u = np.float32(z >> np.uint64(40)) * np.float32(1.0 / (1 << 24))
+                out[y, x] = d + np.float32(0.25) * u <= np.float32(1.1)
+
+
+@lru_cache(maxsize=1)
+def _ellipse_kernel():
+    """_ellipse_mask_py compiled with Numba (or None without it), on first use."""
+    global HAS_NUMBA
+    try:
+        from numba import njit
+    except ImportError:
+        HAS_NUMBA = False
+        return None
+    return njit(
+        "void(b1[:, ::1], f4, f4, f4, f4, i8, i8, i8, i8, u8)",
+        fastmath=True,
+        boundscheck=False,
+        cache=True,
+    )(_ellipse_mask_py)
+
 
 class MedSAM3Predictor:
     """
@@ -32,15 +142,32 @@ class MedSAM3Predictor:
     Supports both point and box prompts for 2D segmentation.
     """
 
-    def __init__(self, checkpoint_path: str = None, device: str = None):
+    def __init__(
+        self,
+        checkpoint_path: str = None,
+        device: str = None,
+        compile_model: bool = True,
+    ):
         """
         Initialize predictor with checkpoint.
 
         Args:
             checkpoint_path: Path to .ckpt file (optional, can load later)
             device: 'cuda', 'mps', or 'cpu' (auto-detected if None)
+            compile_model: torch.compile the model on CUDA (set False to
+                fall back to eager mode)
         """
-        if not HAS_TORCH:
+        # Per-thread scratch buffers (segment_slice may run in worker threads)
+        self._local = threading.local()
+        # SAM3's own image processor, when the built model supports it
+        self._processor = None
+        self.compile_model = compile_model
+        if compile_model:
+            # Must be set before the first torch.compile; an explicit
+            # TORCHINDUCTOR_CACHE_DIR wins
+            os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(INDUCTOR_CACHE_DIR))
+
+        if not _load_torch():
             self.device = "cpu"
             self.model = None
             self.model_loaded = False
@@ -60,6 +187,25 @@ class MedSAM3Predictor:
         self.model = None
         self.model_loaded = False
 
+        # Ampere+: TF32 for any float32 matmuls left outside autocast, and
+        # bf16 autocast for the forward (fp16 where bf16 is unsupported)
+        self._amp_dtype = None
+        if device == "cuda":
+            torch.set_float32_matmul_precision("high")
+            self._amp_dtype = (
+                torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            )
+
+        # Hand-captured CUDA graphs for an eager CUDA model, one per box
+        # count; replays share static buffers, hence the lock
+        self._use_cuda_graphs = False
+        self._graphs = {}
+        self._graph_lock = threading.Lock()
+
+        # Slices per forward pass; 1 once a (batch-1 traced) TorchScript
+        # image encoder is swapped in
+        self._max_batch = MAX_BATCH_SLICES
+
         if checkpoint_path:
             self.load_model(checkpoint_path)
 
@@ -87,13 +233,17 @@ class MedSAM3Predictor:
         try:
             # Load checkpoint
             print(f"Loading checkpoint from {checkpoint_path}...")
-            checkpoint = torch.load(checkpoint_path, map_location="cpu")
+            checkpoint = self._load_checkpoint(checkpoint_path)
 
             # Extract state dict (handle Lightning format)
             if "state_dict" in checkpoint:
                 state_dict = checkpoint["state_dict"]
-                # Remove 'model.' prefix if present (Lightning wrapper)
-                state_dict = {k.replace("model.", ""): v for k, v in state_dict.items()}
+                # Remove the leading 'model.' (Lightning wrapper) in place;
+                # inner "model." segments of a key are left alone
+                prefix = "model."
+                for k in list(state_dict):
+                    if k.startswith(prefix):
+                        state_dict[k[len(prefix) :]] = state_dict.pop(k)
             else:
                 state_dict = checkpoint
 
@@ -101,14 +251,29 @@ class MedSAM3Predictor:
             try:
                 from sam3 import build_sam3_image_model
 
-                self.model = build_sam3_image_model(
-                    device=self.device,
+                build_kwargs = dict(
                     eval_mode=True,
                     checkpoint_path=None,
                     load_from_HF=False,
                     enable_segmentation=True,
                     enable_inst_interactivity=True,
                 )
+                try:
+                    self.model = build_sam3_image_model(
+                        device=self.device, **build_kwargs
+                    )
+                except Exception as e:
+                    if self.device == "cuda":
+                        raise
+                    # The SAM3 builder assumes CUDA in places; build on the
+                    # CPU (the device check below moves the model). The
+                    # default-device context is per thread, unlike patching
+                    # torch, so concurrent requests are unaffected
+                    print(f"SAM3 build on {self.device} failed ({e}); retrying on CPU")
+                    with torch.device("cpu"):
+                        self.model = build_sam3_image_model(
+                            device="cpu", **build_kwargs
+                        )
             except ImportError as e:
                 print(f"SAM3 import failed: {e}")
                 print("Running in demo mode")
@@ -123,10 +288,64 @@ class MedSAM3Predictor:
                     print(f"Missing keys: {len(missing)}")
                 if unexpected:
                     print(f"Unexpected keys: {len(unexpected)}")
+                # Weights are copied into the model; free the loaded copy
+                del checkpoint, state_dict
 
-                self.model = self.model.to(self.device)
+                # Built on self.device already; only move it if it isn't
+                param = next(self.model.parameters(), None)
+                if (
+                    param is not None
+                    and param.device.type != torch.device(self.device).type
+                ):
+                    self.model = self.model.to(self.device)
                 self.model.eval()
                 self.model_loaded = True
+
+                # A SAM3 image model is prompted through Sam3Processor +
+                # predict_inst, not its forward, so there is nothing to compile
+                if hasattr(self.model, "predict_inst"):
+                    self._processor = self._sam3_processor()
+
+                # Inductor fuses the encoder's kernels and reduce-overhead
+                # replays them as CUDA graphs, cutting per-op launch cost
+                if (
+                    self._processor is None
+                    and self.compile_model
+                    and self.device == "cuda"
+                    and hasattr(torch, "compile")
+                ):
+                    self.model = torch.compile(
+                        self.model, mode="reduce-overhead", dynamic=False
+                    )
+                elif (
+                    self._processor is None
+                    and self.compile_model
+                    and self.device == "cpu"
+                    and hasattr(torch, "compile")
+                    and self._param_counts()[0] <= CPU_COMPILE_MAX_PARAMS
+                ):
+                    # Graph capture without Inductor's codegen, for small models
+                    self.model = torch.compile(self.model, backend="aot_eager")
+
+                # Compile now rather than on the first request, and make
+                # sure the model accepts our prompted call at all
+                if not self._warmup():
+                    return False
+
+                if self.device != "cuda":
+                    print(
+                        f"Skipping CUDA-only optimizations on {self.device}: "
+                        "bf16 autocast, CUDA graphs, reduce-overhead compile"
+                    )
+
+                # reduce-overhead already replays CUDA graphs; an eager CUDA
+                # model (not compiled, or compile failed) gets captured ones
+                self._use_cuda_graphs = (
+                    self.device == "cuda"
+                    and self._processor is None
+                    and not hasattr(self.model, "_orig_mod")
+                )
+
                 print(f"Model loaded successfully on {self.device}")
                 return True
 
@@ -139,6 +358,134 @@ class MedSAM3Predictor:
 
         return False
 
+    def export_torchscript(self, out_path: str) -> bool:
+        """
+        Trace the loaded model's image encoder at the fixed (1, 3, S, S)
+        input and save it frozen as TorchScript: a compile-free fast path
+        (see load_torchscript) that also loads from C++.
+
+        Returns:
+            True if successful
+        """
+        if not self.model_loaded or self.model is None:
+            print("Cannot export - no model loaded")
+            return False
+
+        try:
+            model = getattr(self.model, "_orig_mod", self.model)
+            encoder = getattr(model, self._image_encoder_name(model)).eval()
+            dummy = torch.zeros(
+                (1, 3, self.image_size, self.image_size), device=self.device
+            )
+            with torch.no_grad():
+                traced = torch.jit.freeze(torch.jit.trace(encoder, dummy))
+            traced.save(str(out_path))
+            print(f"TorchScript image encoder saved to {out_path}")
+            return True
+        except Exception as e:
+            print(f"TorchScript export failed: {e}")
+            return False
+
+    def load_torchscript(self, path: str) -> bool:
+        """
+        Swap the loaded model's image encoder for one saved by
+        export_torchscript, dropping torch.compile; use when compiling is
+        too slow to start or fails.
+
+        Returns:
+            True if successful
+        """
+        if not self.model_loaded or self.model is None:
+            print("Cannot load TorchScript encoder - no model loaded")
+            return False
+
+        try:
+            encoder = torch.jit.load(str(path), map_location=self.device)
+            model = getattr(self.model, "_orig_mod", self.model)
+            setattr(model, self._image_encoder_name(model), encoder)
+        except Exception as e:
+            print(f"TorchScript load failed: {e}")
+            return False
+
+        self.model = model
+        # Traced at batch 1; graphs captured around the old encoder are stale
+        self._max_batch = 1
+        with self._graph_lock:
+            self._graphs.clear()
+        self._use_cuda_graphs = self.device == "cuda"
+        print(f"TorchScript image encoder loaded from {path}")
+        return True
+
+    @staticmethod
+    def _image_encoder_name(model) -> str:
+        """Attribute holding the model's image encoder."""
+        for name in ("image_encoder", "backbone"):
+            if hasattr(model, name):
+                return name
+        raise AttributeError("Model has no image_encoder/backbone attribute")
+
+    def _warmup(self) -> bool:
+        """
+        Run a dummy prompt through the model: compiles (or loads from the
+        Inductor cache) and records the CUDA graphs now instead of on the
+        first request. A failing compiled model falls back to eager; if the
+        eager model fails too, model_loaded is cleared so requests get demo
+        masks instead of errors. Returns whether the model works.
+        """
+        center = self.image_size / 2
+        dummy = np.zeros((self.image_size, self.image_size), dtype=np.float32)
+        prompt = {"points": [[center, center]], "labels": [1]}
+        print("Warming up model...")
+        while True:
+            try:
+                # Goes through segment_slice, so the model is compiled under
+                # inference_mode like every later call; compiling under
+                # another grad mode would fail the guards and recompile on
+                # first use. reduce-overhead records its CUDA graphs on a
+                # later call
+                for _ in range(2):
+                    self.segment_slice(dummy, prompt)
+                return True
+            except Exception as e:
+                if hasattr(self.model, "_orig_mod"):
+                    print(f"Compiled model failed ({e}); falling back to eager mode")
+                    self.model = self.model._orig_mod
+                    continue
+                print(f"Model forward failed ({e}); running in demo mode")
+                self.model_loaded = False
+                return False
+
+    def _sam3_processor(self):
+        """
+        sam3's Sam3Processor around the model (it embeds images for
+        predict_inst), or None if this sam3 doesn't ship one.
+        """
+        try:
+            from sam3.model.sam3_image_processor import Sam3Processor
+        except ImportError as e:
+            print(f"Sam3Processor import failed: {e}")
+            return None
+        params = inspect.signature(Sam3Processor).parameters
+        kwargs = {"device": self.device} if "device" in params else {}
+        return Sam3Processor(self.model, **kwargs)
+
+    def _load_checkpoint(self, checkpoint_path: Path) -> Dict:
+        """
+        torch.load straight onto self.device, memory-mapped and weights-only
+        where this PyTorch supports it, instead of staging through CPU RAM.
+        """
+        params = inspect.signature(torch.load).parameters
+        fast = {k: True for k in ("mmap", "weights_only") if k in params}
+        try:
+            return torch.load(checkpoint_path, map_location=self.device, **fast)
+        except (pickle.UnpicklingError, RuntimeError) as e:
+            # Legacy (non-zip) files can't be memory-mapped, and Lightning
+            # checkpoints may pickle non-tensor objects
+            print(f"Fast checkpoint load failed ({e}); retrying with a plain load")
+
+        plain = {"weights_only": False} if "weights_only" in params else {}
+        return torch.load(checkpoint_path, map_location=self.device, **plain)
+
     def segment_slice(
         self,
         slice_data: np.ndarray,
@@ -159,34 +506,460 @@ class MedSAM3Predictor:
         Returns:
             Binary mask of shape (H, W)
         """
-        original_shape = slice_data.shape[:2]
+        return self.segment_slices([slice_data], [prompt], window_center, window_width)[
+            0
+        ]
+
+    def segment_slices(
+        self,
+        slices: List[np.ndarray],
+        prompts: List[Dict],
+        window_center: float = None,
+        window_width: float = None,
+    ) -> np.ndarray:
+        """
+        Segment several same-shape 2D slices (e.g. a volume's), batching up
+        to MAX_BATCH_SLICES of them into each forward pass.
+
+        Args:
+            slices: 2D numpy arrays, all (H, W)
+            prompts: One segment_slice-style prompt per slice
+            window_center: Optional CT window center
+            window_width: Optional CT window width
+
+        Returns:
+            Binary masks of shape (N, H, W)
+        """
+        if len(slices) != len(prompts):
+            raise ValueError("Need exactly one prompt per slice")
+        shape = slices[0].shape[:2]
+        if any(s.shape[:2] != shape for s in slices):
+            raise ValueError("All slices must have the same shape")
 
-        # If model not loaded, return a demo mask
+        # If model not loaded, return demo masks
         if not self.model_loaded or self.model is None:
-            return self._generate_demo_mask(original_shape, prompt)
+            return np.stack([self._generate_demo_mask(shape, p) for p in prompts])
+
+        if self._processor is not None:
+            return np.stack(
+                [
+                    self._segment_sam3(s, p, window_center, window_width)
+                    for s, p in zip(slices, prompts)
+                ]
+            )
+
+        # Boxes can't be padded (an empty box is still a box prompt), so
+        # only slices with the same number of boxes share a batch
+        groups = {}
+        for i, prompt in enumerate(prompts):
+            groups.setdefault(len(prompt.get("boxes") or ()), []).append(i)
+
+        batches = [
+            indices[start : start + self._max_batch]
+            for indices in groups.values()
+            for start in range(0, len(indices), self._max_batch)
+        ]
+        masks = np.empty((len(slices),) + tuple(shape), dtype=bool)
+        if self.device == "cuda" and len(batches) > 1:
+            self._segment_pipelined(
+                batches, slices, prompts, window_center, window_width, masks
+            )
+            return masks
+
+        for batch in batches:
+            masks[batch] = self._segment_batch(
+                [slices[i] for i in batch],
+                [prompts[i] for i in batch],
+                window_center,
+                window_width,
+            )
+        return masks
+
+    def _segment_batch(
+        self, slices: List[np.ndarray], prompts: List[Dict], window_center, window_width
+    ) -> np.ndarray:
+        """One forward pass over B <= self._max_batch slices -> (B, H, W) masks."""
+        shape = slices[0].shape[:2]
+        # inference_mode, not no_grad: no autograd version counting or view
+        # tracking at all. The input buffers are created and written under
+        # it too (inference tensors can't be modified outside it)
+        with torch.inference_mode():
+            images = self._preprocess(slices, window_center, window_width)
+            points, labels, boxes = self._prompt_tensors(prompts, shape)
+            return self._predict(images, points, labels, boxes, shape).cpu().numpy()
+
+    def _segment_sam3(
+        self, slice_data: np.ndarray, prompt: Dict, window_center, window_width
+    ) -> np.ndarray:
+        """
+        One slice through SAM3's interactive (SAM1-task) API: Sam3Processor
+        resizes and normalizes the 8-bit slice itself, and predict_inst
+        takes the prompt in slice pixels and returns masks at the slice's
+        resolution (one per box, merged here).
+        """
+        shape = slice_data.shape[:2]
+        lo, width = self._intensity_range(slice_data, window_center, window_width)
+        img = np.subtract(slice_data, np.float32(lo), dtype=np.float32)
+        img *= np.float32(255 / width)
+        np.clip(img, 0, 255, out=img)
+        # (3, H, W) uint8, the layout set_image reads the size from
+        image = torch.from_numpy(img.astype(np.uint8))[None].expand(3, -1, -1)
+
+        point_coords = point_labels = box = None
+        if prompt.get("points"):
+            point_coords = np.asarray(prompt["points"], dtype=np.float32)[:, :2]
+            labels = prompt.get("labels")
+            point_labels = (
+                np.ones(len(point_coords), dtype=np.int64)
+                if labels is None
+                else np.asarray(labels[: len(point_coords)], dtype=np.int64)
+            )
+        if prompt.get("boxes"):
+            box = np.asarray(prompt["boxes"], dtype=np.float32).reshape(-1, 4)
+            if len(box) == 1:
+                box = box[0]
+
+        with torch.inference_mode(), self._autocast():
+            state = self._processor.set_image(image)
+            masks, _, _ = self.model.predict_inst(
+                state,
+                point_coords=point_coords,
+                point_labels=point_labels,
+                box=box,
+                multimask_output=False,
+            )
+        masks = np.asarray(masks).reshape((-1,) + tuple(shape))
+        return (masks > 0).any(axis=0)
+
+    def _segment_pipelined(
+        self,
+        batches: List[List[int]],
+        slices: List[np.ndarray],
+        prompts: List[Dict],
+        window_center,
+        window_width,
+        masks: np.ndarray,
+    ) -> None:
+        """
+        CUDA: segment the batches into masks[batch] with each batch's
+        preprocessing and host-to-device copy overlapping the previous
+        batch's forward. Batches alternate between two input buffer slots;
+        inputs are copied on a side stream and masks read back
+        asynchronously.
+        """
+        shape = masks.shape[1:]
+        compute = torch.cuda.current_stream()
+        copy_stream = self._copy_stream()
+
+        def stage(i):
+            # Inputs for batch i, copied on the side stream; compute waits
+            # on the returned event before using them
+            batch = batches[i]
+            with torch.cuda.stream(copy_stream):
+                images = self._preprocess(
+                    [slices[j] for j in batch], window_center, window_width, i % 2
+                )
+                inputs = self._prompt_tensors([prompts[j] for j in batch], shape)
+            for t in inputs:
+                if t is not None:
+                    # Allocated on the side stream, freed after compute's use
+                    t.record_stream(compute)
+            return (images,) + inputs, copy_stream.record_event()
+
+        with torch.inference_mode():
+            staged = stage(0)
+            pending = None
+            for i, batch in enumerate(batches):
+                inputs, ready = staged
+                compute.wait_event(ready)
+                out = self._predict(*inputs, shape).to("cpu", non_blocking=True)
+                done = compute.record_event()
+
+                # Batch i - 1 finishing frees its slot for batch i + 1, which
+                # is prepared while batch i runs
+                if pending is not None:
+                    self._collect(masks, *pending)
+                pending = batch, out, done
+                if i + 1 < len(batches):
+                    staged = stage(i + 1)
+            self._collect(masks, *pending)
+
+    @staticmethod
+    def _collect(masks: np.ndarray, batch: List[int], out, done) -> None:
+        """Wait for an asynchronous mask readback and store it in masks[batch]."""
+        done.synchronize()
+        masks[batch] = out.numpy()
+
+    def _copy_stream(self) -> "torch.cuda.Stream":
+        """This thread's side stream for host-to-device input copies."""
+        stream = getattr(self._local, "copy_stream", None)
+        if stream is None:
+            stream = self._local.copy_stream = torch.cuda.Stream()
+        return stream
+
+    def _predict(self, images, points, labels, boxes, shape) -> "torch.Tensor":
+        """
+        Prompted forward pass plus postprocessing, all enqueued on the
+        current stream: (B, H, W) bool masks on the device.
+        """
+        # The captured graphs are single-slice
+        if (
+            images.shape[0] == 1
+            and self._use_cuda_graphs
+            and self._fits_graph(points, boxes)
+        ):
+            try:
+                with self._graph_lock:
+                    logits = self._graph_forward(images, points, labels, boxes)
+                    # Resized out of the static output before the next replay
+                    return self._postprocess(logits, shape)
+            except RuntimeError as e:
+                print(f"CUDA graph failed ({e}); using the eager forward")
+                self._use_cuda_graphs = False
+
+        with self._autocast():
+            logits = self._forward(images, points, labels, boxes)
+        return self._postprocess(logits, shape)
+
+    def _autocast(self):
+        """Mixed-precision context for the model forward (CUDA only)."""
+        if self._amp_dtype is None:
+            return contextlib.nullcontext()
+        # No autocast weight-cast cache: cached casts would go stale
+        # inside captured CUDA graphs
+        return torch.autocast(
+            device_type="cuda", dtype=self._amp_dtype, cache_enabled=False
+        )
+
+    @staticmethod
+    def _fits_graph(points, boxes) -> bool:
+        """Whether a prompt fits a captured graph's padded prompt buffers."""
+        return (points is None or points.shape[1] <= MAX_GRAPH_POINTS) and (
+            boxes is None or boxes.shape[1] <= MAX_GRAPH_BOXES
+        )
+
+    def _graph_forward(self, image, points, labels, boxes) -> "torch.Tensor":
+        """
+        Replay the CUDA graph for this prompt's box count (capturing it on
+        first use) with the points padded to MAX_GRAPH_POINTS. Returns the
+        graph's static output, valid until the next replay; callers hold
+        self._graph_lock.
+        """
+        n_boxes = 0 if boxes is None else boxes.shape[1]
+        if n_boxes not in self._graphs:
+            self._graphs[n_boxes] = self._capture_graph(n_boxes)
+        graph, (static_image, static_points, static_labels, static_boxes), out = (
+            self._graphs[n_boxes]
+        )
+
+        static_image.copy_(image)
+        static_points.zero_()
+        static_labels.fill_(-1)  # SAM's "not a point" padding label
+        if points is not None:
+            static_points[:, : points.shape[1]].copy_(points)
+            static_labels[:, : points.shape[1]].copy_(labels)
+        if static_boxes is not None:
+            static_boxes.copy_(boxes)
+
+        graph.replay()
+        return out
+
+    def _capture_graph(self, n_boxes: int) -> Tuple:
+        """
+        Capture one forward pass over static input buffers as a CUDA graph:
+        returns (graph, (image, points, labels, boxes), output).
+        """
+        S = self.image_size
+        image = torch.zeros((1, 3, S, S), device=self.device)
+        points = torch.zeros((1, MAX_GRAPH_POINTS, 2), device=self.device)
+        labels = torch.full(
+            (1, MAX_GRAPH_POINTS), -1, dtype=torch.int64, device=self.device
+        )
+        boxes = torch.zeros((1, n_boxes, 4), device=self.device) if n_boxes else None
+
+        # Warm up on a side stream so lazy initialization and cuDNN
+        # autotuning happen outside the capture
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream), self._autocast():
+            for _ in range(3):
+                self._forward(image, points, labels, boxes)
+        torch.cuda.current_stream().wait_stream(stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph), self._autocast():
+            out = self._forward(image, points, labels, boxes)
+        return graph, (image, points, labels, boxes), out
+
+    def _preprocess(
+        self,
+        slices: List[np.ndarray],
+        window_center: float = None,
+        window_width: float = None,
+        slot: int = 0,
+    ) -> "torch.Tensor":
+        """
+        Window (CT) or min-max normalize 2D slices to [-1, 1] and resize them
+        to the model input: a (B, 3, S, S) float32 batch on the device. The
+        batch is a view of this thread's reusable input buffer for slot,
+        overwritten by the next call with the same slot.
+        """
+        B = len(slices)
+        size = (self.image_size, self.image_size)
+        host, batch = self._input_buffers(B, slot)
+        use_cv2 = _load_cv2()
+
+        for b, slice_data in enumerate(slices):
+            lo, width = self._intensity_range(slice_data, window_center, window_width)
+
+            # One float32 copy, then in place: clip((x - lo) / width, 0, 1)
+            # mapped onto SAM's [-1, 1] input range
+            img = np.subtract(slice_data, np.float32(lo), dtype=np.float32)
+            img *= np.float32(2 / width)
+            img -= 1
+            np.clip(img, -1, 1, out=img)
+
+            if use_cv2:
+                # OpenCV's SIMD resize straight into the (pinned) host buffer
+                cv2.resize(
+                    img, size, dst=host[b].numpy(), interpolation=cv2.INTER_LINEAR
+                )
+            else:
+                batch[b, 0] = F.interpolate(
+                    torch.from_numpy(img).to(self.device)[None, None],
+                    size=size,
+                    mode="bilinear",
+                    align_corners=False,
+                )[0, 0]
+
+        if use_cv2:
+            # One asynchronous copy of the single channels. The previous
+            # copy out of host is done: its masks have been read back
+            batch[:B, 0].copy_(host[:B], non_blocking=True)
+
+        # Grayscale -> 3 channels
+        batch[:B, 1:] = batch[:B, :1]
+        return batch[:B]
+
+    @staticmethod
+    def _intensity_range(
+        slice_data: np.ndarray, window_center, window_width
+    ) -> Tuple[float, float]:
+        """
+        (lo, width) mapped onto the model's input range: the CT window if
+        one is given, else the slice's min-max range.
+        """
+        if window_center is not None and window_width is not None:
+            return window_center - window_width / 2, window_width
+        lo, hi = float(np.min(slice_data)), float(np.max(slice_data))
+        return lo, hi - lo if hi > lo else 1.0
+
+    def _input_buffers(self, n: int, slot: int = 0) -> Tuple:
+        """
+        This thread's model-input buffers for slot, (re)allocated to hold at
+        least n slices: an (n, S, S) float32 host tensor (pinned on CUDA) and
+        the (n, 3, S, S) device batch.
+        """
+        slots = getattr(self._local, "inputs", None)
+        if slots is None:
+            slots = self._local.inputs = {}
+        buffers = slots.get(slot)
+        if buffers is None or buffers[0].shape[0] < n:
+            S = self.image_size
+            host = torch.empty(
+                (n, S, S), dtype=torch.float32, pin_memory=self.device == "cuda"
+            )
+            batch = torch.empty((n, 3, S, S), dtype=torch.float32, device=self.device)
+            buffers = slots[slot] = (host, batch)
+        return buffers
 
-        # Real inference would go here
-        # For now, always use demo mask
-        return self._generate_demo_mask(original_shape, prompt)
+    def _prompt_tensors(self, prompts: List[Dict], shape: Tuple[int, int]) -> Tuple:
+        """
+        Prompt points (B, N, 2), labels (B, N) and boxes (B, M, 4) as device
+        tensors in model-input pixels; None for absent prompt types. Point
+        lists are padded to the longest with label -1 ("not a point"); all
+        prompts must have the same number of boxes.
+        """
+        H, W = shape
+        scale = np.array([self.image_size / W, self.image_size / H], np.float32)
+        B = len(prompts)
+        points = labels = boxes = None
+
+        n_points = max(len(p.get("points") or ()) for p in prompts)
+        if n_points:
+            pts = np.zeros((B, n_points, 2), dtype=np.float32)
+            lbl = np.full((B, n_points), -1, dtype=np.int64)
+            for b, prompt in enumerate(prompts):
+                if not prompt.get("points"):
+                    continue
+                p = np.asarray(prompt["points"], dtype=np.float32)[:, :2]
+                pts[b, : len(p)] = p * scale
+                labels_b = prompt.get("labels")
+                lbl[b, : len(p)] = 1 if labels_b is None else labels_b[: len(p)]
+            points = torch.from_numpy(pts).to(self.device)
+            labels = torch.from_numpy(lbl).to(self.device)
+
+        if prompts[0].get("boxes"):
+            bxs = np.stack(
+                [
+                    np.asarray(p["boxes"], dtype=np.float32).reshape(-1, 4)
+                    for p in prompts
+                ]
+            )
+            boxes = torch.from_numpy(bxs * np.tile(scale, 2)).to(self.device)
+
+        return points, labels, boxes
+
+    def _forward(self, images, points, labels, boxes) -> "torch.Tensor":
+        """
+        Prompted forward pass: (B, 3, S, S) images -> (B, 1, h, w) mask
+        logits. The only place the model itself is called.
+        """
+        out = self.model(images, point_coords=points, point_labels=labels, boxes=boxes)
+        # Accept (masks, scores, ...) tuples and dict outputs
+        if isinstance(out, dict):
+            out = out["masks"] if "masks" in out else out["pred_masks"]
+        elif isinstance(out, (tuple, list)):
+            out = out[0]
+        if out.ndim == 3:
+            out = out[:, None]
+        # Multimask output: keep the first candidate
+        return out[:, :1]
+
+    def _postprocess(self, logits, shape: Tuple[int, int]) -> "torch.Tensor":
+        """
+        (B, 1, h, w) logits -> (B, H, W) bool device masks at the slice's
+        resolution. Resizing and thresholding stay on the device, so only one
+        byte per output pixel is copied back instead of the float32 logits.
+        """
+        logits = F.interpolate(
+            logits.float(),
+            size=tuple(shape),
+            mode="bilinear",
+            align_corners=False,
+        )
+        return logits[:, 0] > 0
 
     def _generate_demo_mask(self, shape: Tuple[int, int], prompt: Dict) -> np.ndarray:
         """
         Generate a demo mask when model is not available.
         Creates a smooth elliptical region around the prompt point.
         """
-        mask = np.zeros(shape, dtype=bool)
         H, W = shape
 
         # Get center point from prompt
         if "points" in prompt and prompt["points"]:
-            # Use first foreground point
-            fg_points = [
-                (p[0], p[1])
-                for i, p in enumerate(prompt["points"])
-                if prompt.get("labels", [1] * len(prompt["points"]))[i] == 1
-            ]
-            if fg_points:
-                cx, cy = fg_points[0]
+            # Use first foreground point (all points count as foreground
+            # when no labels are given)
+            pts = np.asarray(prompt["points"], dtype=np.float64)
+            labels = prompt.get("labels")
+            if labels is None:
+                fg_points = pts
+            else:
+                labels = np.asarray(labels[: len(pts)], dtype=np.int64)
+                fg_points = pts[labels == 1]
+            if fg_points.size:
+                cx, cy = float(fg_points[0, 0]), float(fg_points[0, 1])
             else:
                 cx, cy = W / 2, H / 2
         elif "boxes" in prompt and prompt["boxes"]:
@@ -199,21 +972,66 @@ class MedSAM3Predictor:
         rx = min(H, W) // 6  # radius x
         ry = min(H, W) // 7  # radius y
 
-        y_grid, x_grid = np.ogrid[:H, :W]
-        dist = ((x_grid - cx) / rx) ** 2 + ((y_grid - cy) / ry) ** 2
+        # Nothing outside the boundary band (dist < 1.25, i.e. within
+        # sqrt(1.25) ~ 1.118 radii) can be set, so only its bounding box
+        # is computed
+        mask = np.zeros(shape, dtype=bool)
+        x0, x1 = max(0, int(cx - 1.13 * rx)), min(W, int(cx + 1.13 * rx) + 1)
+        y0, y1 = max(0, int(cy - 1.13 * ry)), min(H, int(cy + 1.13 * ry) + 1)
+        if x0 >= x1 or y0 >= y1:
+            return mask
+
+        seed = int(cx * 100 + cy * 10) % (2**31)
+        kernel = _ellipse_kernel() if HAS_NUMBA else None
+        if kernel is not None:
+            kernel(mask, cx, cy, rx, ry, x0, x1, y0, y1, seed)
+            return mask
+
+        # float32 scalars keep the math in float32 on the float32 grids
+        # (a float64 box coordinate would otherwise promote it under NEP 50)
+        fcx, fcy, frx, fry = np.float32((cx, cy, rx, ry))
+        y_grid, x_grid = _grids(H, W)
+        dist = ((x_grid[:, x0:x1] - fcx) / frx) ** 2 + (
+            (y_grid[y0:y1] - fcy) / fry
+        ) ** 2
 
-        # Create smooth ellipse with slight irregularity
-        base_mask = dist <= 1.0
+        # Create smooth ellipse with slight irregularity (written through
+        # the ROI view)
+        roi = mask[y0:y1, x0:x1]
+        np.less_equal(dist, np.float32(1.0), out=roi)
 
-        # Add some natural-looking boundary variation
-        np.random.seed(int(cx * 100 + cy * 10) % (2**31))
-        noise = np.random.random((H, W)) * 0.25
-        boundary = (dist > 0.75) & (dist < 1.25)
-        mask = base_mask.copy()
-        mask[boundary] = (dist[boundary] + noise[boundary]) <= 1.1
+        # Add some natural-looking boundary variation: dist + 0.25 * noise
+        # <= 1.1, with the scale folded into the threshold. Noise is drawn
+        # only for the band's pixels, from a local (thread-safe) Generator
+        boundary = (dist > np.float32(0.75)) & (dist < np.float32(1.25))
+        rng = np.random.default_rng(seed)
+        noise = self._noise_buffer(np.count_nonzero(boundary))
+        rng.random(out=noise, dtype=np.float32)
+        roi[boundary] = noise <= (np.float32(1.1) - dist[boundary]) * 4
 
         return mask
 
+    def _noise_buffer(self, size: int) -> np.ndarray:
+        """
+        A size-long prefix of this thread's flat float32 noise buffer,
+        which grows as needed.
+        """
+        noise = getattr(self._local, "noise", None)
+        if noise is None or noise.size < size:
+            noise = np.empty(size, dtype=np.float32)
+            self._local.noise = noise
+        return noise[:size]
+
+    def _param_counts(self) -> Tuple[int, int]:
+        """(total, trainable) parameter counts, in one pass over them."""
+        total = trainable = 0
+        for p in self.model.parameters():
+            n = p.numel()
+            total += n
+            if p.requires_grad:
+                trainable += n
+        return total, trainable
+
     def get_model_info(self) -> Dict:
         """Get information about the loaded model."""
         info = {
@@ -225,11 +1043,7 @@ class MedSAM3Predictor:
         }
 
         if self.model is not None and self.model_loaded:
-            # Count parameters
-            total_params = sum(p.numel() for p in self.model.parameters())
-            trainable_params = sum(
-                p.numel() for p in self.model.parameters() if p.requires_grad
-            )
+            total_params, trainable_params = self._param_counts()
             info["total_params"] = total_params
             info["trainable_params"] = trainable_params
 